@@ -1,28 +1,25 @@
+import asyncio
 import tkinter as tk
 from tkinter import messagebox, ttk
 import autogen
-import threading
 import sys
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from autogengui.console import BoundedTextRedirector, default_transcript_path
+from autogengui.streaming import enable_streaming, install_streaming_output
+from autogengui.jobs import JobCancelled, QueueFull, show_jobs
+from autogengui.engine import ChatEngine, use_async_replies
+from autogengui.cancel import watch_cancellation, with_turn_timeout
+from autogengui.rendering import MessageRenderer, RenderingGroupChatManager
+from autogengui.broadcast import BroadcastGroupChatManager, broadcast_groupchat, create_aggregator
+
 global dark_mode
 dark_mode = True  # Start in dark mode by default
 
 
 
 
-class TextRedirector:
-    def __init__(self, text_widget):
-        self.text_widget = text_widget
-
-    def write(self, string):
-        self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)
-        self.text_widget.update_idletasks()
-
-    def flush(self):
-        pass
-
 api_key = os.getenv("OPENAI_API_KEY", "default-api-key")
 
 default_base_url = "http://127.0.0.1:5000/v1/"
@@ -35,7 +32,9 @@ config_list = [
     }
 ]
 
-llm_config = {"config_list": config_list, "cache_seed": 42}
+llm_config = enable_streaming(with_turn_timeout({"config_list": config_list, "cache_seed": 42}))
+streaming_output = install_streaming_output()
+job_queue = ChatEngine()  # chats on the same agents run one at a time, all on one event loop
 
 def toggle_agent_config():
     if agent_frame.winfo_ismapped():
@@ -96,8 +95,23 @@ def reinitialize_agents():
         llm_config=llm_config,
     )
 
-    groupchat = autogen.GroupChat(agents=[user_proxy, agent1, agent2, agent3], messages=[], max_round=12, speaker_selection_method="round_robin")
-    manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=llm_config)
+    message_renderer.add_agents(user_proxy, agent1, agent2, agent3)
+    if broadcast_var.get():
+        # The three agents answer each round together and the Aggregator merges their answers.
+        aggregator = create_aggregator(llm_config)
+        message_renderer.add_agents(aggregator)
+        groupchat = broadcast_groupchat([user_proxy, agent1, agent2, agent3])
+        manager = BroadcastGroupChatManager(groupchat=groupchat, renderer=message_renderer, responders=[agent1, agent2, agent3],
+                                            aggregator=aggregator, llm_config=llm_config)
+        streaming_output.watch(aggregator)
+        watch_cancellation(aggregator)
+        use_async_replies(aggregator)
+    else:
+        groupchat = autogen.GroupChat(agents=[user_proxy, agent1, agent2, agent3], messages=[], max_round=12, speaker_selection_method="round_robin")
+        manager = RenderingGroupChatManager(groupchat=groupchat, renderer=message_renderer, llm_config=llm_config)
+    streaming_output.watch(agent1, agent2, agent3)
+    watch_cancellation(user_proxy, agent1, agent2, agent3, manager)
+    use_async_replies(user_proxy, agent1, agent2, agent3)
 
 def update_agent_config():
     reinitialize_agents()
@@ -112,25 +126,32 @@ user_proxy = autogen.UserProxyAgent(
 )
 
 def handle_request():
-    def run_request():
-        user_request = input_text.get("1.0", tk.END).strip()
-        if user_request:
-            try:
-                update_status("Processing request...")
-                user_proxy.initiate_chat(manager, message=user_request)
-                formatted_output = format_output("Chat Ended.")
-                output_text.insert(tk.END, formatted_output + '\n')
-                output_text.see(tk.END)
-                root.update_idletasks()
-                update_status("Request completed")
-            except Exception as e:
-                print(f"Error: {e}")
-                update_status("Error occurred")
-        else:
-            messagebox.showerror("Error", "Please enter a request!")
-
-    request_thread = threading.Thread(target=run_request)
-    request_thread.start()
+    user_request = input_text.get("1.0", tk.END).strip()
+    if not user_request:
+        messagebox.showerror("Error", "Please enter a request!")
+        return
+    chat_manager = manager  # keep the agents this request was made to, even if they are reinitialized
+
+    async def run_request(user_request):
+        try:
+            update_status("Processing request...")
+            await user_proxy.a_initiate_chat(chat_manager, message=user_request)
+            formatted_output = format_output("Chat Ended.")
+            output_redirector.write(formatted_output + '\n')
+            update_status(f"Request completed (output: {output_redirector.stats()})")
+        except (JobCancelled, asyncio.CancelledError) as e:
+            print(f"Stopped: {e}")
+            update_status("Request stopped")
+            raise
+        except Exception as e:
+            print(f"Error: {e}")
+            update_status("Error occurred")
+            raise
+
+    try:
+        job_queue.submit(user_request, run_request, session=chat_manager)
+    except QueueFull as e:
+        messagebox.showerror("Queue Full", str(e))
 
 def format_output(chat_res):
     return f"Output:\n{chat_res}\n"
@@ -178,12 +199,11 @@ def update_widget_colors(widget, bg_color, fg_color, highlight_color):
         update_widget_colors(child, bg_color, fg_color, highlight_color)
 
 def clear_output():
-    output_text.delete(1.0, tk.END)
+    output_redirector.clear()
     update_status("Output cleared")
 
 def update_status(message):
-    status_bar.config(text=message)
-    root.update_idletasks()
+    root.after(0, lambda: status_bar.config(text=message))
 
 # GUI setup
 root = tk.Tk()
@@ -279,6 +299,10 @@ agent3_message_entry.insert(tk.END, "Agent 3 system message.")
 set_agent_button = tk.Button(agent_frame, text="Set Agent Config", command=update_agent_config, fg="green", bg="black")
 set_agent_button.grid(row=6, column=0, sticky="w", pady=10, columnspan=2)
 
+broadcast_var = tk.BooleanVar(value=False)
+broadcast_checkbutton = tk.Checkbutton(agent_frame, text="Broadcast: agents answer together, Aggregator merges", variable=broadcast_var, command=reinitialize_agents, fg="white", bg="black", selectcolor="black", activebackground="black", activeforeground="white")
+broadcast_checkbutton.grid(row=6, column=1, sticky="e", pady=10)
+
 toggle_agent_config_button = tk.Button(root, text="Hide Agent Config", command=toggle_agent_config, fg="green", bg="black")
 toggle_agent_config_button.grid(row=3, column=0, sticky="w", padx=10, pady=(5, 0))
 
@@ -314,15 +338,23 @@ button_frame.grid(row=6, column=0, sticky="ew", padx=10, pady=(0, 10))
 button_frame.columnconfigure(0, weight=1)
 button_frame.columnconfigure(1, weight=1)
 button_frame.columnconfigure(2, weight=1)
+button_frame.columnconfigure(3, weight=1)
 
 start_button = tk.Button(button_frame, text="Start", command=handle_request, fg="green", bg="black")
 start_button.grid(row=0, column=0, sticky="w")
 
+stop_button = tk.Button(button_frame, text="Stop", command=job_queue.cancel_all, fg="green", bg="black")
+stop_button.grid(row=0, column=1)
+
 clear_button = tk.Button(button_frame, text="Clear Output", command=clear_output, fg="green", bg="black")
-clear_button.grid(row=0, column=1)
+clear_button.grid(row=0, column=2)
 
 dark_mode_button = tk.Button(button_frame, text="Toggle Dark Mode", command=toggle_dark_mode, fg="green", bg="black")
-dark_mode_button.grid(row=0, column=2, sticky="e")
+dark_mode_button.grid(row=0, column=3, sticky="e")
+
+job_listbox = tk.Listbox(button_frame, height=3, fg="green", bg="black", highlightthickness=0)
+job_listbox.grid(row=1, column=0, columnspan=4, sticky="ew", pady=(5, 0))
+show_jobs(job_queue, job_listbox)
 
 output_frame = tk.Frame(root, bg="black")
 output_frame.grid(row=7, column=0, sticky="nsew", padx=10, pady=(0, 10))
@@ -340,8 +372,10 @@ scrollbar.config(command=output_text.yview)
 status_bar = tk.Label(root, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W, fg="green", bg="black")
 status_bar.grid(row=8, column=0, sticky="ew")
 
-sys.stdout = TextRedirector(output_text)
-sys.stderr = TextRedirector(output_text)
+output_redirector = BoundedTextRedirector(output_text, default_transcript_path("3AgentGC"))
+sys.stdout = output_redirector
+sys.stderr = output_redirector
+message_renderer = MessageRenderer(output_redirector, streaming_output=streaming_output)
 
 # Initial agent setup after GUI elements are defined
 reinitialize_agents()
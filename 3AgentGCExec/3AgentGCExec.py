@@ -1,25 +1,21 @@
+import asyncio
 import tkinter as tk
 from tkinter import messagebox
 import autogen
-from autogen.coding import LocalCommandLineCodeExecutor
-import threading
 import sys
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from autogengui.console import BoundedTextRedirector, default_transcript_path
+from autogengui.streaming import enable_streaming, install_streaming_output
+from autogengui.jobs import JobCancelled, QueueFull, show_jobs
+from autogengui.engine import ChatEngine, use_async_replies
+from autogengui.cancel import CancellableCodeExecutor, watch_cancellation, with_turn_timeout
+from autogengui.rendering import MessageRenderer, RenderingGroupChatManager
+from autogengui.broadcast import BroadcastGroupChatManager, broadcast_groupchat, create_aggregator
 
 
 
-class TextRedirector:
-    def __init__(self, text_widget):
-        self.text_widget = text_widget
-
-    def write(self, string):
-        self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)
-        self.text_widget.update_idletasks()
-
-    def flush(self):
-        pass
 
 default_base_url = "http://127.0.0.1:5000/v1/"
 config_list = [
@@ -31,7 +27,9 @@ config_list = [
     }
 ]
 
-llm_config = {"config_list": config_list, "cache_seed": 42}
+llm_config = enable_streaming(with_turn_timeout({"config_list": config_list, "cache_seed": 42}))
+streaming_output = install_streaming_output()
+job_queue = ChatEngine()  # chats on the same agents run one at a time, all on one event loop
 
 def toggle_agent_config():
     if agent_frame.winfo_ismapped():
@@ -83,8 +81,23 @@ def reinitialize_agents():
         llm_config=llm_config,
     )
 
-    groupchat = autogen.GroupChat(agents=[user_proxy, agent1, agent2, agent3], messages=[], max_round=12, speaker_selection_method="round_robin")
-    manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=llm_config)
+    message_renderer.add_agents(user_proxy, agent1, agent2, agent3)
+    if broadcast_var.get():
+        # The three agents answer each round together and the Aggregator merges their answers.
+        aggregator = create_aggregator(llm_config)
+        message_renderer.add_agents(aggregator)
+        groupchat = broadcast_groupchat([user_proxy, agent1, agent2, agent3])
+        manager = BroadcastGroupChatManager(groupchat=groupchat, renderer=message_renderer, responders=[agent1, agent2, agent3],
+                                            aggregator=aggregator, llm_config=llm_config)
+        streaming_output.watch(aggregator)
+        watch_cancellation(aggregator)
+        use_async_replies(aggregator)
+    else:
+        groupchat = autogen.GroupChat(agents=[user_proxy, agent1, agent2, agent3], messages=[], max_round=12, speaker_selection_method="round_robin")
+        manager = RenderingGroupChatManager(groupchat=groupchat, renderer=message_renderer, llm_config=llm_config)
+    streaming_output.watch(agent1, agent2, agent3)
+    watch_cancellation(user_proxy, agent1, agent2, agent3, manager)
+    use_async_replies(user_proxy, agent1, agent2, agent3)
 
 def update_agent_config():
     reinitialize_agents()
@@ -95,26 +108,33 @@ user_proxy = autogen.UserProxyAgent(
     system_message="A human admin.",
     code_execution_config={
         # the executor to run the generated code
-        "executor": LocalCommandLineCodeExecutor(work_dir="coding"),
+        "executor": CancellableCodeExecutor(work_dir="coding"),
     },
     human_input_mode="TERMINATE",
 )
 
 def handle_request():
-    def run_request():
-        user_request = input_text.get("1.0", tk.END).strip()
-        if user_request:
-            try:
-                user_proxy.initiate_chat(manager, message=user_request)
-                formatted_output = format_output("Chat Ended.")
-                output_text.insert(tk.END, formatted_output + '\n')
-                output_text.see(tk.END)
-                root.update_idletasks()
-            except Exception as e:
-                print(f"Error: {e}")
-
-    request_thread = threading.Thread(target=run_request)
-    request_thread.start()
+    user_request = input_text.get("1.0", tk.END).strip()
+    if not user_request:
+        return
+    chat_manager = manager  # keep the agents this request was made to, even if they are reinitialized
+
+    async def run_request(user_request):
+        try:
+            await user_proxy.a_initiate_chat(chat_manager, message=user_request)
+            formatted_output = format_output("Chat Ended.")
+            output_redirector.write(formatted_output + '\n')
+        except (JobCancelled, asyncio.CancelledError) as e:
+            print(f"Stopped: {e}")
+            raise
+        except Exception as e:
+            print(f"Error: {e}")
+            raise
+
+    try:
+        job_queue.submit(user_request, run_request, session=chat_manager)
+    except QueueFull as e:
+        messagebox.showerror("Queue Full", str(e))
 
 def format_output(chat_res):
     # Ensure the triple backticks are handled properly
@@ -216,6 +236,10 @@ agent3_message_entry.insert(tk.END, "Agent 3 system message.")
 set_agent_button = tk.Button(agent_frame, text="Set Agent Config", command=update_agent_config, fg="red", bg="black")
 set_agent_button.grid(row=6, column=0, sticky="w", pady=10, columnspan=2)
 
+broadcast_var = tk.BooleanVar(value=False)
+broadcast_checkbutton = tk.Checkbutton(agent_frame, text="Broadcast: agents answer together, Aggregator merges", variable=broadcast_var, command=reinitialize_agents, fg="white", bg="black", selectcolor="black", activebackground="black", activeforeground="white")
+broadcast_checkbutton.grid(row=6, column=1, sticky="e", pady=10)
+
 input_label = tk.Label(agent_frame, text="Enter initial prompt:", fg="white", bg="black", font=label_font)
 input_label.grid(row=7, column=0, sticky="w", pady=(0, 0), columnspan=2)
 
@@ -233,6 +257,13 @@ input_text.config(yscrollcommand=input_scrollbar.set)
 start_button = tk.Button(input_frame, text="Start", command=handle_request, fg="red", bg="black")
 start_button.grid(row=1, column=0, sticky="w", pady=(5, 0))
 
+stop_button = tk.Button(input_frame, text="Stop", command=job_queue.cancel_all, fg="red", bg="black")
+stop_button.grid(row=1, column=0, sticky="e", pady=(5, 0))
+
+job_listbox = tk.Listbox(input_frame, height=3, fg="red", bg="black", highlightthickness=0)
+job_listbox.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+show_jobs(job_queue, job_listbox)
+
 output_frame = tk.Frame(root, bg="black")
 output_frame.grid(row=4, column=0, columnspan=1, sticky="nsew", padx=10, pady=(10, 10))
 output_frame.columnconfigure(0, weight=1)
@@ -246,8 +277,10 @@ output_text.grid(row=0, column=0, sticky="nsew")
 
 scrollbar.config(command=output_text.yview)
 
-sys.stdout = TextRedirector(output_text)
-sys.stderr = TextRedirector(output_text)
+output_redirector = BoundedTextRedirector(output_text, default_transcript_path("3AgentGCExec"))
+sys.stdout = output_redirector
+sys.stderr = output_redirector
+message_renderer = MessageRenderer(output_redirector, streaming_output=streaming_output)
 
 # Initial agent setup after GUI elements are defined
 reinitialize_agents()
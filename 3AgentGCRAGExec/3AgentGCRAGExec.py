@@ -1,26 +1,25 @@
+import asyncio
 import tkinter as tk
 from tkinter import messagebox
 import autogen
-from autogen.coding import LocalCommandLineCodeExecutor
-import threading
 import sys
 import os
-import requests
-import tempfile
-from pypdf import PdfReader
-from docx import Document
 
-class TextRedirector:
-    def __init__(self, text_widget):
-        self.text_widget = text_widget
-
-    def write(self, string):
-        self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)
-        self.text_widget.update_idletasks()
-
-    def flush(self):
-        pass
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from autogengui.console import BoundedTextRedirector, default_transcript_path
+from autogengui.streaming import enable_streaming, install_streaming_output
+from autogengui.jobs import JobCancelled, QueueFull, show_jobs
+from autogengui.engine import ChatEngine, use_async_replies
+from autogengui.cancel import CancellableCodeExecutor, watch_cancellation, with_turn_timeout
+from autogengui.rendering import MessageRenderer, RenderingGroupChatManager
+from autogengui.broadcast import BroadcastGroupChatManager, broadcast_groupchat, create_aggregator
+from autogengui.documents import DocumentHandler
+from autogengui.loader import DocumentLoader, create_parse_pool
+from autogengui.store import CorpusStore, default_store_path
+from autogengui.retrieval import DEFAULT_CHUNK_SIZE, DEFAULT_TOP_K, RETRIEVAL_MODES, DocumentIndex, default_vector_path, format_chunk
+from autogengui.ingest import BackgroundIndexer, expand_sources
+from autogengui.tokens import DEFAULT_TOKEN_BUDGET, ContextPacker
+from autogengui.summarize import DocumentSummarizer
 
 # Retrieve API key from environment variable
 api_key = os.getenv("OPENAI_API_KEY", "default-api-key")
@@ -35,9 +34,25 @@ config_list = [
     }
 ]
 
-llm_config = {"config_list": config_list, "cache_seed": 42}
-
-context_documents = []
+llm_config = enable_streaming(with_turn_timeout({"config_list": config_list, "cache_seed": 42}))
+streaming_output = install_streaming_output()
+job_queue = ChatEngine()  # chats on the same agents run one at a time, all on one event loop
+
+corpus_store = CorpusStore(default_store_path("3AgentGCRAGExec"))
+context_documents = corpus_store.load_corpus()
+document_handler = DocumentHandler(parse_executor=create_parse_pool())
+document_loader = DocumentLoader(document_handler)
+document_index = DocumentIndex(vector_path=default_vector_path("3AgentGCRAGExec"), store=corpus_store)
+context_packer = ContextPacker(model=config_list[0]["model"])
+document_indexer = BackgroundIndexer(
+    document_index,
+    document_loader,
+    on_progress=lambda done, total: update_status(f"Indexing documents: {done}/{total}"),
+    on_done=lambda total, failures: report_indexing(total, failures),
+)
+retrieval_top_k = DEFAULT_TOP_K  # 0 pastes whole documents instead of retrieved chunks
+document_summarizer = DocumentSummarizer(config_list)
+summarize_oversized = False  # map-reduce whole documents that would not fit the token budget
 
 default_prompt = (
     "You're running on arch linux not debian. You don't need to write scripts to disk "
@@ -47,68 +62,85 @@ default_prompt = (
 
 current_prompt = default_prompt
 
-def read_document(path):
-    if path.startswith('http://') or path.startswith('https://'):
-        if path.endswith('.pdf'):
-            response = requests.get(path)
-            temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-            temp_pdf.write(response.content)
-            temp_pdf.close()
-            return read_pdf(temp_pdf.name)
-        elif path.endswith('.docx'):
-            response = requests.get(path)
-            temp_docx = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
-            temp_docx.write(response.content)
-            temp_docx.close()
-            return read_docx(temp_docx.name)
-        else:
-            response = requests.get(path)
-            return response.text
-    elif path.endswith('.pdf'):
-        return read_pdf(path)
-    elif path.endswith('.docx'):
-        return read_docx(path)
-    else:
-        with open(path, 'r') as file:
-            return file.read()
-
-def read_pdf(file_path):
-    reader = PdfReader(file_path)
-    text = ''
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
-
-def read_docx(file_path):
-    doc = Document(file_path)
-    return '\n'.join([para.text for para in doc.paragraphs])
-
 def add_document():
     document_paths = document_entry.get().split(',')
-    global context_documents
+    global context_documents, retrieval_top_k, summarize_oversized
+    try:
+        top_k = int(top_k_spinbox.get())
+        chunk_size = int(chunk_size_spinbox.get())
+        token_budget = int(token_budget_spinbox.get())
+    except ValueError:
+        messagebox.showerror("Invalid Retrieval Settings", "Top-k, chunk size and token budget must be whole numbers.")
+        return
+    context_packer.budget = token_budget
+    retrieval_top_k = top_k
+    summarize_oversized = summarize_var.get()
+    document_index.configure(chunk_size=max(chunk_size, 1), mode=retrieval_mode_var.get())
     context_documents = [doc.strip() for doc in document_paths if doc.strip()]
+    corpus_store.save_corpus(context_documents)
+    document_indexer.set_sources(context_documents)
     messagebox.showinfo("Documents Updated", f"Documents updated: {context_documents}")
 
+def retrieve_documents(query, fixed_text):
+    if retrieval_top_k <= 0:
+        candidates, failures = document_loader.load_texts(expand_sources(context_documents))
+        for path, error in failures:
+            print(f"Skipping document {path}: {error}")
+        if summarize_oversized and candidates:
+            candidates = document_summarizer.summarize_many(
+                candidates,
+                context_packer.available(fixed_text) // len(candidates),
+                progress=lambda done, total: update_status(f"Summarizing document sections: {done}/{total}"),
+            )
+    else:
+        for result in document_index.update(expand_sources(context_documents), document_loader):
+            print(f"Skipping document {result.path}: {result.error}")
+        candidates = [format_chunk(chunk) for _, chunk in document_index.search(query, retrieval_top_k)]
+    packed = context_packer.pack(fixed_text, candidates)
+    update_status(packed.summary())
+    return "\n\n".join(packed.texts)
+
 def my_message_generator(sender, recipient, context):
     user_request = context.get("user_request")
-    documents_content = "\n".join([read_document(doc) for doc in context_documents])
-    return f"{current_prompt}\nUser Request: {user_request}\nDocuments:\n{documents_content}"
+    message = f"{current_prompt}\nUser Request: {user_request}\nDocuments:\n"
+    return message + retrieve_documents(user_request, message)
+
+def report_indexing(total, failures):
+    for result in failures:
+        print(f"Skipping document {result.path}: {result.error}")
+    message = f"Indexed {total - len(failures)} of {total} documents"
+    duplicates = document_index.dedup_summary()
+    if duplicates:
+        message += f", {duplicates}"
+    update_status(message)
+
+def update_status(message):
+    root.after(0, lambda: status_bar.config(text=message))
 
 def handle_request():
-    def run_request():
-        user_request = input_text.get("1.0", tk.END).strip()
-        if user_request:
-            try:
-                user_proxy.initiate_chat(manager, message=my_message_generator, user_request=user_request)
-                formatted_output = format_output("Chat Ended.")
-                output_text.insert(tk.END, formatted_output + '\n')
-                output_text.see(tk.END)
-                root.update_idletasks()
-            except Exception as e:
-                print(f"Error: {e}")
-
-    request_thread = threading.Thread(target=run_request)
-    request_thread.start()
+    user_request = input_text.get("1.0", tk.END).strip()
+    if not user_request:
+        return
+    chat_manager = manager  # keep the agents this request was made to, even if they are reinitialized
+
+    async def run_request(user_request):
+        try:
+            # Retrieval blocks, so the message is built off the event loop.
+            message = await asyncio.to_thread(my_message_generator, user_proxy, chat_manager, {"user_request": user_request})
+            await user_proxy.a_initiate_chat(chat_manager, message=message)
+            formatted_output = format_output("Chat Ended.")
+            output_redirector.write(formatted_output + '\n')
+        except (JobCancelled, asyncio.CancelledError) as e:
+            print(f"Stopped: {e}")
+            raise
+        except Exception as e:
+            print(f"Error: {e}")
+            raise
+
+    try:
+        job_queue.submit(user_request, run_request, session=chat_manager)
+    except QueueFull as e:
+        messagebox.showerror("Queue Full", str(e))
 
 def format_output(chat_res):
     chat_res = chat_res.replace("```", "\n```")
@@ -163,8 +195,23 @@ def reinitialize_agents():
         llm_config=llm_config,
     )
 
-    groupchat = autogen.GroupChat(agents=[user_proxy, agent1, agent2, agent3], messages=[], max_round=12, speaker_selection_method="round_robin")
-    manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=llm_config)
+    message_renderer.add_agents(user_proxy, agent1, agent2, agent3)
+    if broadcast_var.get():
+        # The three agents answer each round together and the Aggregator merges their answers.
+        aggregator = create_aggregator(llm_config)
+        message_renderer.add_agents(aggregator)
+        groupchat = broadcast_groupchat([user_proxy, agent1, agent2, agent3])
+        manager = BroadcastGroupChatManager(groupchat=groupchat, renderer=message_renderer, responders=[agent1, agent2, agent3],
+                                            aggregator=aggregator, llm_config=llm_config)
+        streaming_output.watch(aggregator)
+        watch_cancellation(aggregator)
+        use_async_replies(aggregator)
+    else:
+        groupchat = autogen.GroupChat(agents=[user_proxy, agent1, agent2, agent3], messages=[], max_round=12, speaker_selection_method="round_robin")
+        manager = RenderingGroupChatManager(groupchat=groupchat, renderer=message_renderer, llm_config=llm_config)
+    streaming_output.watch(agent1, agent2, agent3)
+    watch_cancellation(user_proxy, agent1, agent2, agent3, manager)
+    use_async_replies(user_proxy, agent1, agent2, agent3)
 
 def update_agent_config():
     reinitialize_agents()
@@ -174,7 +221,7 @@ user_proxy = autogen.UserProxyAgent(
     name="User_proxy",
     system_message="A human admin.",
     code_execution_config={
-        "executor": LocalCommandLineCodeExecutor(work_dir="coding"),
+        "executor": CancellableCodeExecutor(work_dir="coding"),
     },
     human_input_mode="TERMINATE",
 )
@@ -211,7 +258,7 @@ agent_frame.columnconfigure(1, weight=1)
 agent_frame.columnconfigure(2, weight=1)
 agent_frame.columnconfigure(3, weight=1)
 
-document_label = tk.Label(root, text="Enter URL or File Path:", fg="white", bg="black")
+document_label = tk.Label(root, text="Enter URLs, File Paths, Folders or Globs:", fg="white", bg="black")
 document_label.grid(row=5, column=0, sticky="w")
 
 document_frame = tk.Frame(root, bg="black")
@@ -220,10 +267,46 @@ document_frame.columnconfigure(0, weight=1)
 
 document_entry = tk.Entry(document_frame, width=60, bg="black", fg="red", highlightbackground="red", highlightcolor="red", highlightthickness=1, insertbackground="red")
 document_entry.grid(row=0, column=0, sticky="ew")
+document_entry.insert(0, ", ".join(context_documents))
 
 add_document_button = tk.Button(document_frame, text="Update Documents", command=add_document, fg="red", bg="black")
 add_document_button.grid(row=1, column=0, sticky="w", pady=(5, 0))
 
+retrieval_frame = tk.Frame(document_frame, bg="black")
+retrieval_frame.grid(row=2, column=0, sticky="w", pady=(5, 0))
+
+top_k_label = tk.Label(retrieval_frame, text="Top-k chunks (0 = whole documents):", fg="white", bg="black")
+top_k_label.grid(row=0, column=0, sticky="w")
+top_k_spinbox = tk.Spinbox(retrieval_frame, from_=0, to=100, width=5, bg="black", fg="red", highlightbackground="red", highlightcolor="red", highlightthickness=1, insertbackground="red")
+top_k_spinbox.grid(row=0, column=1, sticky="w", padx=(5, 15))
+top_k_spinbox.delete(0, tk.END)
+top_k_spinbox.insert(0, DEFAULT_TOP_K)
+
+chunk_size_label = tk.Label(retrieval_frame, text="Chunk size (words):", fg="white", bg="black")
+chunk_size_label.grid(row=0, column=2, sticky="w")
+chunk_size_spinbox = tk.Spinbox(retrieval_frame, from_=20, to=2000, increment=20, width=6, bg="black", fg="red", highlightbackground="red", highlightcolor="red", highlightthickness=1, insertbackground="red")
+chunk_size_spinbox.grid(row=0, column=3, sticky="w", padx=5)
+chunk_size_spinbox.delete(0, tk.END)
+chunk_size_spinbox.insert(0, DEFAULT_CHUNK_SIZE)
+
+retrieval_mode_label = tk.Label(retrieval_frame, text="Retrieval:", fg="white", bg="black")
+retrieval_mode_label.grid(row=0, column=4, sticky="w", padx=(15, 0))
+retrieval_mode_var = tk.StringVar(value=RETRIEVAL_MODES[0])
+retrieval_mode_menu = tk.OptionMenu(retrieval_frame, retrieval_mode_var, *RETRIEVAL_MODES)
+retrieval_mode_menu.config(fg="red", bg="black", highlightthickness=0)
+retrieval_mode_menu.grid(row=0, column=5, sticky="w", padx=5)
+
+token_budget_label = tk.Label(retrieval_frame, text="Token budget:", fg="white", bg="black")
+token_budget_label.grid(row=0, column=6, sticky="w", padx=(15, 0))
+token_budget_spinbox = tk.Spinbox(retrieval_frame, from_=500, to=1000000, increment=500, width=8, bg="black", fg="red", highlightbackground="red", highlightcolor="red", highlightthickness=1, insertbackground="red")
+token_budget_spinbox.grid(row=0, column=7, sticky="w", padx=5)
+token_budget_spinbox.delete(0, tk.END)
+token_budget_spinbox.insert(0, DEFAULT_TOKEN_BUDGET)
+
+summarize_var = tk.BooleanVar(value=False)
+summarize_checkbutton = tk.Checkbutton(retrieval_frame, text="Summarize oversized documents", variable=summarize_var, fg="white", bg="black", selectcolor="black", activebackground="black", activeforeground="white")
+summarize_checkbutton.grid(row=0, column=8, sticky="w", padx=(15, 0))
+
 agent1_name_label = tk.Label(agent_frame, text="Agent 1 Name:", fg="white", bg="black", font=label_font)
 agent1_name_label.grid(row=0, column=0, sticky="w")
 agent1_name_entry = tk.Entry(agent_frame, width=25, bg="black", fg="red", highlightbackground="red", highlightcolor="red", highlightthickness=1, insertbackground="red")
@@ -281,6 +364,10 @@ agent3_message_entry.insert(tk.END, "Agent 3 system message.")
 set_agent_button = tk.Button(agent_frame, text="Set Agent Config", command=update_agent_config, fg="red", bg="black")
 set_agent_button.grid(row=6, column=0, sticky="w", pady=10, columnspan=2)
 
+broadcast_var = tk.BooleanVar(value=False)
+broadcast_checkbutton = tk.Checkbutton(agent_frame, text="Broadcast: agents answer together, Aggregator merges", variable=broadcast_var, command=reinitialize_agents, fg="white", bg="black", selectcolor="black", activebackground="black", activeforeground="white")
+broadcast_checkbutton.grid(row=6, column=1, sticky="e", pady=10)
+
 input_label = tk.Label(agent_frame, text="Enter initial prompt:", fg="white", bg="black", font=label_font)
 input_label.grid(row=7, column=0, sticky="w", pady=(0, 0), columnspan=2)
 
@@ -298,6 +385,13 @@ input_text.config(yscrollcommand=input_scrollbar.set)
 start_button = tk.Button(input_frame, text="Start", command=handle_request, fg="red", bg="black")
 start_button.grid(row=1, column=0, sticky="w", pady=(5, 0))
 
+stop_button = tk.Button(input_frame, text="Stop", command=job_queue.cancel_all, fg="red", bg="black")
+stop_button.grid(row=1, column=0, sticky="e", pady=(5, 0))
+
+job_listbox = tk.Listbox(input_frame, height=3, fg="red", bg="black", highlightthickness=0)
+job_listbox.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+show_jobs(job_queue, job_listbox)
+
 output_frame = tk.Frame(root, bg="black")
 output_frame.grid(row=9, column=0, columnspan=1, sticky="nsew", padx=10, pady=(10, 10))  # Moved output to the bottom (row=9)
 output_frame.columnconfigure(0, weight=1)
@@ -311,9 +405,16 @@ output_text.grid(row=0, column=0, sticky="nsew")
 
 scrollbar.config(command=output_text.yview)
 
-sys.stdout = TextRedirector(output_text)
-sys.stderr = TextRedirector(output_text)
+status_bar = tk.Label(root, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W, fg="red", bg="black")
+status_bar.grid(row=10, column=0, sticky="ew")
+
+output_redirector = BoundedTextRedirector(output_text, default_transcript_path("3AgentGCRAGExec"))
+sys.stdout = output_redirector
+sys.stderr = output_redirector
+message_renderer = MessageRenderer(output_redirector, streaming_output=streaming_output)
 
 reinitialize_agents()
 
+document_indexer.start(context_documents)
+
 root.mainloop()
@@ -1,27 +1,25 @@
+import asyncio
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 import autogen
-from autogen.coding import LocalCommandLineCodeExecutor
 from PIL import Image, ImageTk
 import os
-import threading
 import sys
-import requests
-import tempfile
-from pypdf import PdfReader
-from docx import Document
 
-class TextRedirector:
-    def __init__(self, text_widget):
-        self.text_widget = text_widget
-
-    def write(self, string):
-        self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)
-        self.text_widget.update_idletasks()
-
-    def flush(self):
-        pass
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from autogengui.console import BoundedTextRedirector, default_transcript_path
+from autogengui.streaming import enable_streaming, install_streaming_output
+from autogengui.documents import DocumentHandler
+from autogengui.loader import DocumentLoader, create_parse_pool
+from autogengui.store import CorpusStore, default_store_path
+from autogengui.retrieval import DEFAULT_CHUNK_SIZE, DEFAULT_TOP_K, RETRIEVAL_MODES, DocumentIndex, default_vector_path, format_chunk
+from autogengui.ingest import BackgroundIndexer, expand_sources
+from autogengui.tokens import DEFAULT_TOKEN_BUDGET, ContextPacker
+from autogengui.summarize import DocumentSummarizer
+from autogengui.transcript import TranscriptSummary
+from autogengui.jobs import JobCancelled, QueueFull, show_jobs
+from autogengui.engine import ChatEngine, use_async_replies
+from autogengui.cancel import CancellableCodeExecutor, watch_cancellation, with_turn_timeout
 
 config_list = [
     {
@@ -32,14 +30,19 @@ config_list = [
     }
 ]
 
+streaming_output = install_streaming_output()
+
 assistant = autogen.AssistantAgent(
     name="assistant",
-    llm_config={
+    llm_config=enable_streaming(with_turn_timeout({
         "cache_seed": 41,
         "config_list": config_list,
         "temperature": 0,
-    },
+    })),
 )
+streaming_output.watch(assistant)
+watch_cancellation(assistant)
+use_async_replies(assistant)
 
 user_proxy = autogen.UserProxyAgent(
     name="user_proxy",
@@ -47,11 +50,29 @@ user_proxy = autogen.UserProxyAgent(
     max_consecutive_auto_reply=10,
     is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
     code_execution_config={
-        "executor": LocalCommandLineCodeExecutor(work_dir="coding"),
+        "executor": CancellableCodeExecutor(work_dir="coding"),
     },
 )
-
-context_documents = []
+watch_cancellation(user_proxy)
+use_async_replies(user_proxy)
+
+corpus_store = CorpusStore(default_store_path("CodeExecRAGv1"))
+context_documents = corpus_store.load_corpus()
+document_handler = DocumentHandler(parse_executor=create_parse_pool())
+document_loader = DocumentLoader(document_handler)
+document_index = DocumentIndex(vector_path=default_vector_path("CodeExecRAGv1"), store=corpus_store)
+context_packer = ContextPacker(model=config_list[0]["model"])
+document_indexer = BackgroundIndexer(
+    document_index,
+    document_loader,
+    on_progress=lambda done, total: update_status(f"Indexing documents: {done}/{total}"),
+    on_done=lambda total, failures: report_indexing(total, failures),
+)
+retrieval_top_k = DEFAULT_TOP_K  # 0 pastes whole documents instead of retrieved chunks
+document_summarizer = DocumentSummarizer(config_list)
+summarize_oversized = False  # map-reduce whole documents that would not fit the token budget
+transcript_summary = TranscriptSummary(model=config_list[0]["model"])  # renders the chat locally unless an LLM summary is ticked
+job_queue = ChatEngine()  # chats with the same assistant run one at a time, all on one event loop
 
 default_prompt = (
     "You're running on arch linux not debian. You don't need to write scripts to disk "
@@ -63,46 +84,23 @@ default_base_url = "http://127.0.0.1:5000/v1/"
 
 current_prompt = default_prompt
 
-def read_document(path):
-    if path.startswith('http://') or path.startswith('https://'):
-        if path.endswith('.pdf'):
-            response = requests.get(path)
-            temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-            temp_pdf.write(response.content)
-            temp_pdf.close()
-            return read_pdf(temp_pdf.name)
-        elif path.endswith('.docx'):
-            response = requests.get(path)
-            temp_docx = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
-            temp_docx.write(response.content)
-            temp_docx.close()
-            return read_docx(temp_docx.name)
-        else:
-            response = requests.get(path)
-            return response.text
-    elif path.endswith('.pdf'):
-        return read_pdf(path)
-    elif path.endswith('.docx'):
-        return read_docx(path)
-    else:
-        with open(path, 'r') as file:
-            return file.read()
-
-def read_pdf(file_path):
-    reader = PdfReader(file_path)
-    text = ''
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
-
-def read_docx(file_path):
-    doc = Document(file_path)
-    return '\n'.join([para.text for para in doc.paragraphs])
-
 def add_document():
     document_paths = document_entry.get().split(',')
-    global context_documents
+    global context_documents, retrieval_top_k, summarize_oversized
+    try:
+        top_k = int(top_k_spinbox.get())
+        chunk_size = int(chunk_size_spinbox.get())
+        token_budget = int(token_budget_spinbox.get())
+    except ValueError:
+        messagebox.showerror("Invalid Retrieval Settings", "Top-k, chunk size and token budget must be whole numbers.")
+        return
+    context_packer.budget = token_budget
+    retrieval_top_k = top_k
+    summarize_oversized = summarize_var.get()
+    document_index.configure(chunk_size=max(chunk_size, 1), mode=retrieval_mode_var.get())
     context_documents = [doc.strip() for doc in document_paths if doc.strip()]
+    corpus_store.save_corpus(context_documents)
+    document_indexer.set_sources(context_documents)
     messagebox.showinfo("Documents Updated", f"Documents updated: {context_documents}")
 
 def update_prompt():
@@ -110,33 +108,69 @@ def update_prompt():
     current_prompt = prompt_text.get("1.0", tk.END).strip()
     messagebox.showinfo("Prompt Updated", "The prompt has been updated successfully!")
 
+def retrieve_documents(query, fixed_text):
+    if retrieval_top_k <= 0:
+        candidates, failures = document_loader.load_texts(expand_sources(context_documents))
+        for path, error in failures:
+            print(f"Skipping document {path}: {error}")
+        if summarize_oversized and candidates:
+            candidates = document_summarizer.summarize_many(
+                candidates,
+                context_packer.available(fixed_text) // len(candidates),
+                progress=lambda done, total: update_status(f"Summarizing document sections: {done}/{total}"),
+            )
+    else:
+        for result in document_index.update(expand_sources(context_documents), document_loader):
+            print(f"Skipping document {result.path}: {result.error}")
+        candidates = [format_chunk(chunk) for _, chunk in document_index.search(query, retrieval_top_k)]
+    packed = context_packer.pack(fixed_text, candidates)
+    update_status(packed.summary())
+    return "\n\n".join(packed.texts)
+
 def my_message_generator(sender, recipient, context):
     user_request = context.get("user_request")
-    documents_content = "\n".join([read_document(doc) for doc in context_documents])
-    return f"{current_prompt}\nUser Request: {user_request}\nDocuments:\n{documents_content}"
+    message = f"{current_prompt}\nUser Request: {user_request}\nDocuments:\n"
+    return message + retrieve_documents(user_request, message)
+
+def report_indexing(total, failures):
+    for result in failures:
+        print(f"Skipping document {result.path}: {result.error}")
+    message = f"Indexed {total - len(failures)} of {total} documents"
+    duplicates = document_index.dedup_summary()
+    if duplicates:
+        message += f", {duplicates}"
+    update_status(message)
+
+def update_status(message):
+    root.after(0, lambda: status_bar.config(text=message))
 
 def handle_request():
-    def run_request():
-        user_request = input_text.get("1.0", tk.END).strip()
-        if user_request:
-            try:
-                chat_res = user_proxy.initiate_chat(
-                    assistant,
-                    message=my_message_generator,
-                    user_request=user_request,
-                    summary_method="reflection_with_llm",
-                    summary_args={"summary_prompt": "Return entire conversation in plain text."},
-                )
-                formatted_output = format_output(chat_res)
-                for line in formatted_output.split('\n'):
-                    output_text.insert(tk.END, line + '\n')
-                    output_text.see(tk.END)
-                    root.update_idletasks()
-            except Exception as e:
-                print(f"Error: {e}")
-
-    request_thread = threading.Thread(target=run_request)
-    request_thread.start()
+    user_request = input_text.get("1.0", tk.END).strip()
+    if not user_request:
+        return
+    chat_assistant = assistant  # keep the assistant this request was made to, even if the URL changes
+    use_llm = llm_summary_var.get()
+
+    async def run_request(user_request):
+        try:
+            # Retrieval and an LLM summary block, so they run off the event loop.
+            message = await asyncio.to_thread(my_message_generator, user_proxy, chat_assistant, {"user_request": user_request})
+            chat_res = await user_proxy.a_initiate_chat(chat_assistant, message=message, summary_method=None)
+            chat_res.summary = await asyncio.to_thread(transcript_summary, user_proxy, chat_assistant, {"use_llm": use_llm})
+            formatted_output = format_output(chat_res)
+            output_redirector.write(formatted_output + '\n')
+            update_status(transcript_summary.report())
+        except (JobCancelled, asyncio.CancelledError) as e:
+            print(f"Stopped: {e}")
+            raise
+        except Exception as e:
+            print(f"Error: {e}")
+            raise
+
+    try:
+        job_queue.submit(user_request, run_request, session=chat_assistant)
+    except QueueFull as e:
+        messagebox.showerror("Queue Full", str(e))
 
 def format_output(chat_res):
     content = chat_res.summary
@@ -149,12 +183,15 @@ def set_base_url():
     global assistant
     assistant = autogen.AssistantAgent(
         name="assistant",
-        llm_config={
+        llm_config=enable_streaming(with_turn_timeout({
             "cache_seed": 41,
             "config_list": config_list,
             "temperature": 0,
-        },
+        })),
     )
+    streaming_output.watch(assistant)
+    watch_cancellation(assistant)
+    use_async_replies(assistant)
     messagebox.showinfo("URL Set", "The base URL has been set successfully!")
 
 root = tk.Tk()
@@ -181,7 +218,7 @@ url_entry.insert(0, default_base_url)
 set_url_button = tk.Button(url_frame, text="Set URL", command=set_base_url, fg="red", bg="black")
 set_url_button.pack(side=tk.RIGHT)
 
-document_label = tk.Label(root, text="Enter URL or File Path:", fg="red", bg="black")
+document_label = tk.Label(root, text="Enter URLs, File Paths, Folders or Globs:", fg="red", bg="black")
 document_label.pack(pady=(10, 0))
 
 document_frame = tk.Frame(root)
@@ -189,10 +226,46 @@ document_frame.pack(pady=10)
 
 document_entry = tk.Entry(document_frame, width=60, bg="black", fg="red")
 document_entry.pack(side=tk.LEFT, padx=10)
+document_entry.insert(0, ", ".join(context_documents))
 
 add_document_button = tk.Button(document_frame, text="Update Documents", command=add_document, fg="red", bg="black")
 add_document_button.pack(side=tk.RIGHT)
 
+retrieval_frame = tk.Frame(root, bg="black")
+retrieval_frame.pack(pady=(0, 10))
+
+top_k_label = tk.Label(retrieval_frame, text="Top-k chunks (0 = whole documents):", fg="red", bg="black")
+top_k_label.pack(side=tk.LEFT)
+top_k_spinbox = tk.Spinbox(retrieval_frame, from_=0, to=100, width=5, bg="black", fg="red")
+top_k_spinbox.pack(side=tk.LEFT, padx=(5, 15))
+top_k_spinbox.delete(0, tk.END)
+top_k_spinbox.insert(0, DEFAULT_TOP_K)
+
+chunk_size_label = tk.Label(retrieval_frame, text="Chunk size (words):", fg="red", bg="black")
+chunk_size_label.pack(side=tk.LEFT)
+chunk_size_spinbox = tk.Spinbox(retrieval_frame, from_=20, to=2000, increment=20, width=6, bg="black", fg="red")
+chunk_size_spinbox.pack(side=tk.LEFT, padx=5)
+chunk_size_spinbox.delete(0, tk.END)
+chunk_size_spinbox.insert(0, DEFAULT_CHUNK_SIZE)
+
+retrieval_mode_label = tk.Label(retrieval_frame, text="Retrieval:", fg="red", bg="black")
+retrieval_mode_label.pack(side=tk.LEFT, padx=(15, 0))
+retrieval_mode_var = tk.StringVar(value=RETRIEVAL_MODES[0])
+retrieval_mode_menu = tk.OptionMenu(retrieval_frame, retrieval_mode_var, *RETRIEVAL_MODES)
+retrieval_mode_menu.config(fg="red", bg="black", highlightthickness=0)
+retrieval_mode_menu.pack(side=tk.LEFT, padx=5)
+
+token_budget_label = tk.Label(retrieval_frame, text="Token budget:", fg="red", bg="black")
+token_budget_label.pack(side=tk.LEFT, padx=(15, 0))
+token_budget_spinbox = tk.Spinbox(retrieval_frame, from_=500, to=1000000, increment=500, width=8, bg="black", fg="red")
+token_budget_spinbox.pack(side=tk.LEFT, padx=5)
+token_budget_spinbox.delete(0, tk.END)
+token_budget_spinbox.insert(0, DEFAULT_TOKEN_BUDGET)
+
+summarize_var = tk.BooleanVar(value=False)
+summarize_checkbutton = tk.Checkbutton(retrieval_frame, text="Summarize oversized documents", variable=summarize_var, fg="red", bg="black", selectcolor="black", activebackground="black", activeforeground="red")
+summarize_checkbutton.pack(side=tk.LEFT, padx=(15, 0))
+
 prompt_label = tk.Label(root, text="Edit Prompt:", fg="red", bg="black")
 prompt_label.pack(pady=(10, 0))
 
@@ -227,6 +300,20 @@ input_text.config(yscrollcommand=input_scrollbar.set)
 start_button = tk.Button(input_frame, text="Start", command=handle_request, fg="red", bg="black")
 start_button.pack(side=tk.RIGHT, padx=10)
 
+stop_button = tk.Button(input_frame, text="Stop", command=job_queue.cancel_all, fg="red", bg="black")
+stop_button.pack(side=tk.RIGHT)
+
+llm_summary_var = tk.BooleanVar(value=False)
+llm_summary_checkbutton = tk.Checkbutton(root, text="Summarize the chat with the LLM", variable=llm_summary_var, fg="red", bg="black", selectcolor="black", activebackground="black", activeforeground="red")
+llm_summary_checkbutton.pack()
+
+job_listbox = tk.Listbox(root, height=3, width=80, fg="red", bg="black", highlightthickness=0)
+job_listbox.pack(pady=(5, 0))
+show_jobs(job_queue, job_listbox)
+
+status_bar = tk.Label(root, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W, fg="red", bg="black")
+status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+
 output_frame = tk.Frame(root)
 output_frame.pack(pady=10, expand=True, fill=tk.BOTH)
 
@@ -238,7 +325,10 @@ output_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
 scrollbar.config(command=output_text.yview)
 
-sys.stdout = TextRedirector(output_text)
-sys.stderr = TextRedirector(output_text)
+output_redirector = BoundedTextRedirector(output_text, default_transcript_path("CodeExecRAGv1"))
+sys.stdout = output_redirector
+sys.stderr = output_redirector
+
+document_indexer.start(context_documents)
 
 root.mainloop()
@@ -2,32 +2,30 @@ import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
 import autogen
 from autogen.coding import LocalCommandLineCodeExecutor
-import threading
 import sys
 import os
-import requests
-import tempfile
-from pypdf import PdfReader
-from docx import Document
 import logging
 from urllib.parse import urlparse
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from autogengui.console import BoundedTextRedirector, default_transcript_path
+from autogengui.streaming import enable_streaming, install_streaming_output
+from autogengui.jobs import JobCancelled, JobQueue, QueueFull, show_jobs
+from autogengui.cancel import watch_cancellation, with_turn_timeout
+from autogengui.documents import DocumentHandler
+from autogengui.loader import DocumentLoader, create_parse_pool
+from autogengui.store import CorpusStore, default_store_path
+from autogengui.retrieval import DEFAULT_CHUNK_SIZE, DEFAULT_TOP_K, RETRIEVAL_MODES, DocumentIndex, default_vector_path, format_chunk
+from autogengui.ingest import BackgroundIndexer, expand_sources
+from autogengui.tokens import DEFAULT_TOKEN_BUDGET, ContextPacker
+from autogengui.summarize import DocumentSummarizer
+from autogengui.tools import SEARCH_TOOL_HINT, end_chat_after_replies, register_search_tool
+from autogengui.nested import register_parallel_nested_chats
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class TextRedirector:
-    def __init__(self, text_widget):
-        self.text_widget = text_widget
-
-    def write(self, string):
-        self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)
-        self.text_widget.update_idletasks()
-
-    def flush(self):
-        pass
-
 class AgentConfig:
     def __init__(self, name, system_message):
         self.name = name
@@ -44,59 +42,22 @@ class AppConfig:
                 "tags": ["gpt-4o-mini"]
             }
         ]
-        self.llm_config = {"config_list": self.config_list, "cache_seed": 42}
-        self.context_documents = []
-
-class DocumentHandler:
-    @staticmethod
-    def read_document(path):
-        try:
-            if path.startswith('http://') or path.startswith('https://'):
-                return DocumentHandler._read_url_document(path)
-            else:
-                return DocumentHandler._read_local_document(path)
-        except Exception as e:
-            logger.error(f"Error reading document: {e}")
-            raise
-
-    @staticmethod
-    def _read_url_document(url):
-        response = requests.get(url)
-        response.raise_for_status()
-        if url.endswith('.pdf'):
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(response.content)
-                return DocumentHandler._read_pdf(temp_file.name)
-        elif url.endswith('.docx'):
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
-                temp_file.write(response.content)
-                return DocumentHandler._read_docx(temp_file.name)
-        else:
-            return response.text
-
-    @staticmethod
-    def _read_local_document(path):
-        if path.endswith('.pdf'):
-            return DocumentHandler._read_pdf(path)
-        elif path.endswith('.docx'):
-            return DocumentHandler._read_docx(path)
-        else:
-            with open(path, 'r') as file:
-                return file.read()
-
-    @staticmethod
-    def _read_pdf(file_path):
-        reader = PdfReader(file_path)
-        return '\n'.join([page.extract_text() for page in reader.pages])
-
-    @staticmethod
-    def _read_docx(file_path):
-        doc = Document(file_path)
-        return '\n'.join([para.text for para in doc.paragraphs])
+        self.llm_config = enable_streaming(with_turn_timeout({"config_list": self.config_list, "cache_seed": 42}))
+        self.corpus_store = CorpusStore(default_store_path("NestedGCRAG"))
+        self.context_documents = self.corpus_store.load_corpus()
+        self.retrieval_top_k = DEFAULT_TOP_K  # 0 pastes whole documents instead of retrieved chunks
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        self.token_budget = DEFAULT_TOKEN_BUDGET
+        self.retrieval_mode = RETRIEVAL_MODES[0]
+        self.summarize_oversized = False  # map-reduce whole documents that would not fit the token budget
+        self.documents_on_demand = True  # the Writer calls search_documents instead of getting chunks up front
 
 class AgentManager:
-    def __init__(self, app_config):
+    def __init__(self, app_config, document_index=None, context_packer=None, streaming_output=None):
         self.app_config = app_config
+        self.document_index = document_index
+        self.context_packer = context_packer
+        self.streaming_output = streaming_output
         self.agents = {}
         self.groupchat = None
         self.manager = None
@@ -108,6 +69,8 @@ class AgentManager:
                 llm_config=self.app_config.llm_config,
                 system_message=config.system_message,
             )
+            if self.streaming_output is not None:
+                self.streaming_output.watch(self.agents[config.name])
 
         self.agents['user_proxy'] = autogen.UserProxyAgent(
             name="User_proxy",
@@ -123,18 +86,34 @@ class AgentManager:
         agent3 = self.agents.get('Agent3')
 
         if writer and critic and agent1 and agent2 and agent3:
-            self.agents['user_proxy'].register_nested_chats(
+            # Critique and fact-check both read only the Writer's draft, so they run
+            # side by side; the refinement waits for both, the summary for it.
+            register_parallel_nested_chats(
+                self.agents['user_proxy'],
                 [
-                    {"recipient": critic, "message": self.reflection_message, "summary_method": "last_msg", "max_turns": 1},
-                    {"recipient": agent1, "message": self.refine_message, "summary_method": "last_msg", "max_turns": 1},
-                    {"recipient": agent2, "message": self.fact_check_message, "summary_method": "last_msg", "max_turns": 1},
-                    {"recipient": agent3, "message": self.summarize_message, "summary_method": "last_msg", "max_turns": 1}
+                    {"name": "critique", "recipient": critic, "message": self.reflection_message, "summary_method": "last_msg", "max_turns": 1},
+                    {"name": "fact_check", "recipient": agent2, "message": self.fact_check_message, "summary_method": "last_msg", "max_turns": 1},
+                    {"name": "refine", "recipient": agent1, "message": self.refine_message, "summary_method": "last_msg", "max_turns": 1,
+                     "depends_on": ["critique", "fact_check"]},
+                    {"name": "summarize", "recipient": agent3, "message": self.summarize_message, "summary_method": "last_msg", "max_turns": 1,
+                     "depends_on": ["refine"]}
                 ],
                 trigger=writer,
             )
+            # The Writer's draft and its refinement, however many searches it makes first.
+            end_chat_after_replies(self.agents['user_proxy'], writer, 2)
+
+            # Only the Writer gets the tool: the nested agents answer in a
+            # single turn, so nobody would run a search they asked for.
+            if self.document_index is not None and self.app_config.documents_on_demand:
+                register_search_tool(self.document_index, [writer], executor=self.agents['user_proxy'],
+                                     packer=self.context_packer)
 
             self.groupchat = autogen.GroupChat(agents=list(self.agents.values()), messages=[], max_round=12, speaker_selection_method="round_robin")
             self.manager = autogen.GroupChatManager(groupchat=self.groupchat, llm_config=self.app_config.llm_config)
+            watch_cancellation(self.manager)
+
+        watch_cancellation(*self.agents.values())
 
     @staticmethod
     def reflection_message(recipient, messages, sender, config):
@@ -158,8 +137,22 @@ class Application(tk.Tk):
         self.title("NestedGCRAG")
         self.configure(bg="black")
         self.app_config = AppConfig()
-        self.agent_manager = AgentManager(self.app_config)
-        self.document_handler = DocumentHandler()
+        self.document_handler = DocumentHandler(parse_executor=create_parse_pool())
+        self.document_loader = DocumentLoader(self.document_handler)
+        self.context_packer = ContextPacker(self.app_config.token_budget, model=self.app_config.config_list[0]["model"])
+        self.document_summarizer = DocumentSummarizer(self.app_config.config_list)
+        self.document_index = DocumentIndex(chunk_size=self.app_config.chunk_size, mode=self.app_config.retrieval_mode,
+                                            vector_path=default_vector_path("NestedGCRAG"),
+                                            store=self.app_config.corpus_store)
+        self.document_indexer = BackgroundIndexer(
+            self.document_index,
+            self.document_loader,
+            on_progress=lambda done, total: self.update_status(f"Indexing documents: {done}/{total}"),
+            on_done=self.report_indexing,
+        )
+        self.streaming_output = install_streaming_output()
+        self.agent_manager = AgentManager(self.app_config, self.document_index, self.context_packer, self.streaming_output)
+        self.job_queue = JobQueue()  # chats with the same agents run one at a time
         self.create_widgets()
         self.apply_theme()
 
@@ -170,6 +163,7 @@ class Application(tk.Tk):
         self.create_document_frame()
         self.create_input_frame()
         self.create_output_frame()
+        self.create_status_bar()
         
         self.grid_rowconfigure(5, weight=1)  # Make the output frame expandable
         self.grid_columnconfigure(0, weight=1)  # Make columns expandable
@@ -236,12 +230,38 @@ class Application(tk.Tk):
         self.document_frame = ttk.Frame(self)
         self.document_frame.grid(row=3, column=0, sticky="ew", padx=10, pady=10)
 
-        ttk.Label(self.document_frame, text="Enter URL or File Path:").grid(row=0, column=0, sticky="w")
+        ttk.Label(self.document_frame, text="Enter URLs, File Paths, Folders or Globs:").grid(row=0, column=0, sticky="w")
         self.document_entry = ttk.Entry(self.document_frame, width=60)
         self.document_entry.grid(row=1, column=0, sticky="ew")
+        self.document_entry.insert(0, ", ".join(self.app_config.context_documents))
 
         ttk.Button(self.document_frame, text="Update Documents", command=self.add_document).grid(row=2, column=0, sticky="w", pady=(5, 0))
 
+        retrieval_frame = ttk.Frame(self.document_frame)
+        retrieval_frame.grid(row=3, column=0, sticky="w", pady=(5, 0))
+        ttk.Label(retrieval_frame, text="Top-k chunks (0 = whole documents):").grid(row=0, column=0, sticky="w")
+        self.top_k_spinbox = ttk.Spinbox(retrieval_frame, from_=0, to=100, width=5)
+        self.top_k_spinbox.grid(row=0, column=1, sticky="w", padx=(5, 15))
+        self.top_k_spinbox.set(self.app_config.retrieval_top_k)
+        ttk.Label(retrieval_frame, text="Chunk size (words):").grid(row=0, column=2, sticky="w")
+        self.chunk_size_spinbox = ttk.Spinbox(retrieval_frame, from_=20, to=2000, increment=20, width=6)
+        self.chunk_size_spinbox.grid(row=0, column=3, sticky="w", padx=5)
+        self.chunk_size_spinbox.set(self.app_config.chunk_size)
+        ttk.Label(retrieval_frame, text="Retrieval:").grid(row=0, column=4, sticky="w", padx=(15, 0))
+        self.retrieval_mode_combobox = ttk.Combobox(retrieval_frame, values=RETRIEVAL_MODES, state="readonly", width=8)
+        self.retrieval_mode_combobox.grid(row=0, column=5, sticky="w", padx=5)
+        self.retrieval_mode_combobox.set(self.app_config.retrieval_mode)
+        ttk.Label(retrieval_frame, text="Token budget:").grid(row=0, column=6, sticky="w", padx=(15, 0))
+        self.token_budget_spinbox = ttk.Spinbox(retrieval_frame, from_=500, to=1000000, increment=500, width=8)
+        self.token_budget_spinbox.grid(row=0, column=7, sticky="w", padx=5)
+        self.token_budget_spinbox.set(self.app_config.token_budget)
+        self.summarize_var = tk.BooleanVar(value=self.app_config.summarize_oversized)
+        ttk.Checkbutton(retrieval_frame, text="Summarize oversized documents",
+                        variable=self.summarize_var).grid(row=0, column=8, sticky="w", padx=(15, 0))
+        self.search_tool_var = tk.BooleanVar(value=self.app_config.documents_on_demand)
+        ttk.Checkbutton(retrieval_frame, text="Writer searches documents on demand",
+                        variable=self.search_tool_var).grid(row=1, column=0, columnspan=4, sticky="w", pady=(5, 0))
+
     def create_input_frame(self):
         self.input_frame = ttk.Frame(self)
         self.input_frame.grid(row=4, column=0, sticky="ew", padx=10, pady=10)
@@ -251,6 +271,11 @@ class Application(tk.Tk):
         self.input_text.grid(row=1, column=0, sticky="ew")
 
         ttk.Button(self.input_frame, text="Start", command=self.handle_request).grid(row=2, column=0, sticky="w", pady=(5, 0))
+        ttk.Button(self.input_frame, text="Stop", command=self.job_queue.cancel_all).grid(row=2, column=0, sticky="e", pady=(5, 0))
+
+        self.job_listbox = tk.Listbox(self.input_frame, height=3, bg="black", fg="green", highlightthickness=0)
+        self.job_listbox.grid(row=3, column=0, sticky="ew", pady=(5, 0))
+        show_jobs(self.job_queue, self.job_listbox)
 
     def create_output_frame(self):
         self.output_frame = ttk.Frame(self)
@@ -261,8 +286,9 @@ class Application(tk.Tk):
         self.output_text = tk.Text(self.output_frame, wrap=tk.WORD)
         self.output_text.pack(fill=tk.BOTH, expand=True)
 
-        sys.stdout = TextRedirector(self.output_text)
-        sys.stderr = TextRedirector(self.output_text)
+        self.output_redirector = BoundedTextRedirector(self.output_text, default_transcript_path("NestedGCRAG"))
+        sys.stdout = self.output_redirector
+        sys.stderr = self.output_redirector
 
     def toggle_config(self):
         if self.agent_frame.winfo_viewable():
@@ -284,7 +310,7 @@ class Application(tk.Tk):
         url = self.url_entry.get()
         if self.validate_url(url):
             self.app_config.config_list[0]["base_url"] = url
-            self.agent_manager = AgentManager(self.app_config)
+            self.agent_manager = AgentManager(self.app_config, self.document_index, self.context_packer, self.streaming_output)
             messagebox.showinfo("Config Updated", "Base URL has been updated successfully!")
         else:
             messagebox.showerror("Invalid URL", "Please enter a valid URL.")
@@ -308,8 +334,28 @@ class Application(tk.Tk):
         messagebox.showinfo("Config Updated", "Agent configurations have been updated successfully!")
 
     def add_document(self):
+        try:
+            top_k = int(self.top_k_spinbox.get())
+            chunk_size = int(self.chunk_size_spinbox.get())
+            token_budget = int(self.token_budget_spinbox.get())
+        except ValueError:
+            messagebox.showerror("Invalid Retrieval Settings", "Top-k, chunk size and token budget must be whole numbers.")
+            return
+        self.app_config.token_budget = token_budget
+        self.context_packer.budget = token_budget
+        self.app_config.retrieval_top_k = top_k
+        self.app_config.summarize_oversized = self.summarize_var.get()
+        if self.app_config.documents_on_demand != self.search_tool_var.get():
+            self.app_config.documents_on_demand = self.search_tool_var.get()
+            self.agent_manager.create_agents(self.agent_configs)
+        self.app_config.chunk_size = max(chunk_size, 1)
+        self.app_config.retrieval_mode = self.retrieval_mode_combobox.get()
+        self.document_index.configure(chunk_size=self.app_config.chunk_size, mode=self.app_config.retrieval_mode)
+
         document_paths = self.document_entry.get().split(',')
         self.app_config.context_documents = [doc.strip() for doc in document_paths if doc.strip()]
+        self.app_config.corpus_store.save_corpus(self.app_config.context_documents)
+        self.document_indexer.set_sources(self.app_config.context_documents)
         messagebox.showinfo("Documents Updated", f"Documents updated: {self.app_config.context_documents}")
 
     def create_output_frame(self):
@@ -323,34 +369,90 @@ class Application(tk.Tk):
         self.save_button.pack(side=tk.BOTTOM, pady=5)
         self.save_button.pack_forget()  # Hide the button initially
 
-        sys.stdout = TextRedirector(self.output_text)
-        sys.stderr = TextRedirector(self.output_text)
+        self.output_redirector = BoundedTextRedirector(self.output_text, default_transcript_path("NestedGCRAG"))
+        sys.stdout = self.output_redirector
+        sys.stderr = self.output_redirector
 
     def handle_request(self):
-        def run_request():
-            user_request = self.input_text.get("1.0", tk.END).strip()
-            if user_request:
-                try:
-                    documents_content = "\n".join([self.document_handler.read_document(doc) for doc in self.app_config.context_documents])
-                    context = f"User Request: {user_request}\nDocuments:\n{documents_content}"
-                    res = self.agent_manager.agents['user_proxy'].initiate_chat(
-                        recipient=self.agent_manager.agents['Writer'],
-                        message=context,
-                        max_turns=2,
-                        summary_method="last_msg"
-                    )
-                    self.output_text.insert(tk.END, f"Output:\n{res}\n\nChat Ended.\n")
-                    self.output_text.see(tk.END)
-                    self.save_button.pack(side=tk.BOTTOM, pady=5)  # Show the save button
-                except Exception as e:
-                    logger.error(f"Error in chat: {e}")
-                    messagebox.showerror("Error", f"An error occurred: {e}")
-
-        threading.Thread(target=run_request).start()
+        user_request = self.input_text.get("1.0", tk.END).strip()
+        if not user_request:
+            return
+        agents = self.agent_manager.agents
+        if 'user_proxy' not in agents or 'Writer' not in agents:
+            messagebox.showerror("Error", "Set the agent config before sending a request.")
+            return
+        # Keep the agents this request was made to, even if they are recreated.
+        user_proxy, writer = agents['user_proxy'], agents['Writer']
+        on_demand = self.app_config.documents_on_demand and self.app_config.retrieval_top_k > 0
+
+        def run_request(user_request):
+            try:
+                if on_demand:
+                    context = f"User Request: {user_request}\n{SEARCH_TOOL_HINT}"
+                else:
+                    context = f"User Request: {user_request}\nDocuments:\n"
+                    context += self.retrieve_documents(user_request, context)
+                res = user_proxy.initiate_chat(
+                    recipient=writer,
+                    message=context,
+                    summary_method="last_msg"
+                )
+                self.output_redirector.write(f"Output:\n{res}\n\nChat Ended.\n")
+                self.after(0, lambda: self.save_button.pack(side=tk.BOTTOM, pady=5))  # Show the save button
+            except JobCancelled as e:
+                logger.info(f"Chat stopped: {e}")
+                raise
+            except Exception as e:
+                logger.error(f"Error in chat: {e}")
+                message = f"An error occurred: {e}"
+                self.after(0, lambda: messagebox.showerror("Error", message))
+                raise
 
+        try:
+            self.job_queue.submit(user_request, run_request, session=writer)
+        except QueueFull as e:
+            messagebox.showerror("Queue Full", str(e))
+
+
+    def retrieve_documents(self, query, fixed_text):
+        if self.app_config.retrieval_top_k <= 0:
+            candidates, failures = self.document_loader.load_texts(expand_sources(self.app_config.context_documents))
+            for path, error in failures:
+                logger.warning(f"Skipping document {path}: {error}")
+            if self.app_config.summarize_oversized and candidates:
+                candidates = self.document_summarizer.summarize_many(
+                    candidates,
+                    self.context_packer.available(fixed_text) // len(candidates),
+                    progress=lambda done, total: self.update_status(f"Summarizing document sections: {done}/{total}"),
+                )
+        else:
+            sources = expand_sources(self.app_config.context_documents)
+            for result in self.document_index.update(sources, self.document_loader):
+                logger.warning(f"Skipping document {result.path}: {result.error}")
+            results = self.document_index.search(query, self.app_config.retrieval_top_k)
+            candidates = [format_chunk(chunk) for _, chunk in results]
+        packed = self.context_packer.pack(fixed_text, candidates)
+        self.update_status(packed.summary())
+        return "\n\n".join(packed.texts)
+
+    def report_indexing(self, total, failures):
+        for result in failures:
+            logger.warning(f"Skipping document {result.path}: {result.error}")
+        message = f"Indexed {total - len(failures)} of {total} documents"
+        duplicates = self.document_index.dedup_summary()
+        if duplicates:
+            message += f", {duplicates}"
+        self.update_status(message)
+
+    def create_status_bar(self):
+        self.status_bar = ttk.Label(self, text="Ready", relief=tk.SUNKEN, anchor=tk.W)
+        self.status_bar.grid(row=6, column=0, sticky="ew")
+
+    def update_status(self, message):
+        self.after(0, lambda: self.status_bar.config(text=message))
 
     def save_output(self):
-        output = self.output_text.get("1.0", tk.END)
+        output = self.output_redirector.read_all()
         file_path = filedialog.asksaveasfilename(defaultextension=".txt",
                                                  filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
         if file_path:
@@ -364,4 +466,5 @@ class Application(tk.Tk):
 
 if __name__ == "__main__":
     app = Application()
+    app.document_indexer.start(app.app_config.context_documents)
     app.mainloop()
\ No newline at end of file
@@ -1,24 +1,18 @@
+import asyncio
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 import autogen
-from autogen.coding import LocalCommandLineCodeExecutor
 from PIL import Image, ImageTk  # Import PIL for image handling
 import os
-import threading
 import sys
 
-# Redirect stdout and stderr to the tkinter Text widget
-class TextRedirector:
-    def __init__(self, text_widget):
-        self.text_widget = text_widget
-
-    def write(self, string):
-        self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)
-        self.text_widget.update_idletasks()
-
-    def flush(self):
-        pass
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from autogengui.console import BoundedTextRedirector, default_transcript_path
+from autogengui.streaming import enable_streaming, install_streaming_output
+from autogengui.transcript import TranscriptSummary
+from autogengui.jobs import JobCancelled, QueueFull, show_jobs
+from autogengui.engine import ChatEngine, use_async_replies
+from autogengui.cancel import CancellableCodeExecutor, watch_cancellation, with_turn_timeout
 
 # Initialize the config_list without the base_url
 config_list = [
@@ -30,15 +24,20 @@ config_list = [
     }
 ]
 
+streaming_output = install_streaming_output()
+
 # create an AssistantAgent named "assistant"
 assistant = autogen.AssistantAgent(
     name="assistant",
-    llm_config={
+    llm_config=enable_streaming(with_turn_timeout({
         "cache_seed": 41,  # seed for caching and reproducibility
         "config_list": config_list,  # a list of OpenAI API configurations
         "temperature": 0,  # temperature for sampling
-    },
+    })),
 )
+streaming_output.watch(assistant)
+watch_cancellation(assistant)
+use_async_replies(assistant)
 
 # create a UserProxyAgent instance named "user_proxy"
 user_proxy = autogen.UserProxyAgent(
@@ -48,9 +47,17 @@ user_proxy = autogen.UserProxyAgent(
     is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
     code_execution_config={
         # the executor to run the generated code
-        "executor": LocalCommandLineCodeExecutor(work_dir="coding"),
+        "executor": CancellableCodeExecutor(work_dir="coding"),
     },
 )
+watch_cancellation(user_proxy)
+use_async_replies(user_proxy)
+
+# Renders the chat locally as the summary unless an LLM summary is ticked
+transcript_summary = TranscriptSummary(model=config_list[0]["model"])
+
+# Requests to the same assistant are queued and run one at a time, all on one event loop
+job_queue = ChatEngine()
 
 # Function to generate a message with a bash command based on user input
 def my_message_generator(sender, recipient, context):
@@ -59,28 +66,33 @@ def my_message_generator(sender, recipient, context):
 
 # Function to handle the request and display the output
 def handle_request():
-    def run_request():
-        user_request = input_entry.get()
-        if user_request:
-            try:
-                chat_res = user_proxy.initiate_chat(
-                    assistant,
-                    message=my_message_generator,
-                    user_request=user_request,
-                    summary_method="reflection_with_llm",
-                    summary_args={"summary_prompt": "Return entire conversation in plain text."},
-                )
-                formatted_output = format_output(chat_res)
-                for line in formatted_output.split('\n'):
-                    output_text.insert(tk.END, line + '\n')
-                    output_text.see(tk.END)
-                    root.update_idletasks()  # Force the GUI to update
-            except Exception as e:
-                print(f"Error: {e}")
-
-    # Run the request in a separate thread
-    request_thread = threading.Thread(target=run_request)
-    request_thread.start()
+    user_request = input_entry.get()
+    if not user_request:
+        return
+    chat_assistant = assistant  # keep the assistant this request was made to, even if the URL changes
+    use_llm = llm_summary_var.get()
+
+    async def run_request(user_request):
+        try:
+            message = my_message_generator(user_proxy, chat_assistant, {"user_request": user_request})
+            chat_res = await user_proxy.a_initiate_chat(chat_assistant, message=message, summary_method=None)
+            # An LLM summary blocks, so it is made off the event loop.
+            chat_res.summary = await asyncio.to_thread(transcript_summary, user_proxy, chat_assistant, {"use_llm": use_llm})
+            formatted_output = format_output(chat_res)
+            output_redirector.write(formatted_output + '\n')
+            output_redirector.write(transcript_summary.report() + '\n')
+        except (JobCancelled, asyncio.CancelledError) as e:
+            print(f"Stopped: {e}")
+            raise
+        except Exception as e:
+            print(f"Error: {e}")
+            raise
+
+    # Run the request on the chat engine's event loop
+    try:
+        job_queue.submit(user_request, run_request, session=chat_assistant)
+    except QueueFull as e:
+        messagebox.showerror("Queue Full", str(e))
 
 def format_output(chat_res):
     content = chat_res.summary
@@ -94,12 +106,15 @@ def set_base_url():
     global assistant  # Update the assistant with the new base_url
     assistant = autogen.AssistantAgent(
         name="assistant",
-        llm_config={
+        llm_config=enable_streaming(with_turn_timeout({
             "cache_seed": 41,  # seed for caching and reproducibility
             "config_list": config_list,  # a list of OpenAI API configurations
             "temperature": 0,  # temperature for sampling
-        },
+        })),
     )
+    streaming_output.watch(assistant)
+    watch_cancellation(assistant)
+    use_async_replies(assistant)
     messagebox.showinfo("URL Set", "The base URL has been set successfully!")
 
 # Create the main window
@@ -133,6 +148,20 @@ input_label.pack(pady=(10, 0))
 input_entry = tk.Entry(root, width=60, bg="black", fg="red")
 input_entry.pack(pady=10)
 
+# Create a Checkbutton to ask the LLM for the chat summary instead of rendering it locally
+llm_summary_var = tk.BooleanVar(value=False)
+llm_summary_checkbutton = tk.Checkbutton(root, text="Summarize the chat with the LLM", variable=llm_summary_var, fg="red", bg="black", selectcolor="black", activebackground="black", activeforeground="red")
+llm_summary_checkbutton.pack(pady=(0, 10))
+
+# Create a Listbox showing queued, running and finished requests
+job_listbox = tk.Listbox(root, height=3, width=60, fg="red", bg="black", highlightthickness=0)
+job_listbox.pack(pady=(0, 10))
+show_jobs(job_queue, job_listbox)
+
+# Create a button to stop the running and queued requests
+stop_button = tk.Button(root, text="Stop", command=job_queue.cancel_all, fg="red", bg="black")
+stop_button.pack(pady=(0, 10))
+
 # Create a Frame to hold the Text widget and the Scrollbar
 output_frame = tk.Frame(root)
 output_frame.pack(pady=10)
@@ -149,8 +178,9 @@ output_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 scrollbar.config(command=output_text.yview)
 
 # Redirect stdout and stderr
-sys.stdout = TextRedirector(output_text)
-sys.stderr = TextRedirector(output_text)
+output_redirector = BoundedTextRedirector(output_text, default_transcript_path("OneAgentCodeExec"))
+sys.stdout = output_redirector
+sys.stderr = output_redirector
 
 # Bind the Enter key to handle_request function
 input_entry.bind("<Return>", lambda event: handle_request())
@@ -0,0 +1,4 @@
+# Shared helpers for the AutoGen GUI scripts.
+#
+# Each app lives in its own directory and is run directly (python3 3AgentGC.py),
+# so the scripts put the repository root on sys.path before importing from here.
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+
+import autogen
+from autogen import Agent, GroupChat
+
+from autogengui.rendering import RenderingGroupChatManager
+from autogengui.streaming import quiet_streams
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_ROUNDS = 3  # rounds of answers; the user proxy takes a turn after each
+AGGREGATOR_NAME = "Aggregator"
+AGGREGATOR_SYSTEM_MESSAGE = (
+    "You merge answers that several agents gave to the same message into one reply. Keep every "
+    "correct point and any code they need, drop repetition, and settle disagreements with the "
+    "best-supported answer. Reply with the merged answer only."
+)
+
+
+def create_aggregator(llm_config):
+    return autogen.AssistantAgent(name=AGGREGATOR_NAME, system_message=AGGREGATOR_SYSTEM_MESSAGE, llm_config=llm_config)
+
+
+def broadcast_groupchat(agents):
+    """GroupChat sized for BROADCAST_ROUNDS: each round is the merged answer plus the user proxy's turn."""
+    return GroupChat(agents=agents, messages=[], max_round=2 * BROADCAST_ROUNDS, speaker_selection_method="round_robin")
+
+
+class BroadcastGroupChatManager(RenderingGroupChatManager):
+    """Group chat manager in which the responders answer each message together.
+
+    Instead of taking turns, every agent in `responders` replies to the same
+    chat state at once and `aggregator` merges their answers into the one
+    message the group sees, so a round takes as long as the slowest responder
+    plus the merge. The other agents in the group chat (the user proxy) take
+    their turns between rounds as in round robin. Each answer is still
+    rendered; their tokens are not streamed, as they would interleave.
+
+    Only async chats (a_initiate_chat, as on the ChatEngine) run in broadcast;
+    a sync initiate_chat falls back to the group chat's own speaker selection.
+    """
+
+    def __init__(self, groupchat, renderer, responders, aggregator, **kwargs):
+        super().__init__(groupchat, renderer, **kwargs)
+        self.responders = list(responders)
+        self.aggregator = aggregator
+        self.register_reply(Agent, BroadcastGroupChatManager.a_run_broadcast, config=groupchat,
+                            reset_config=GroupChat.reset, ignore_async_in_sync_chat=True)
+
+    async def a_run_broadcast(self, messages=None, sender=None, config=None):
+        if messages is None:
+            messages = self._oai_messages[sender]
+        message = messages[-1]
+        speaker = sender
+        groupchat = config
+        turns = [agent for agent in groupchat.agents if agent not in self.responders]
+        for i in range(groupchat.max_round):
+            groupchat.append(message, speaker)
+            if self._is_termination_msg(message):
+                break
+            for agent in groupchat.agents:
+                if agent != speaker:
+                    await self.a_send(message, agent, request_reply=False, silent=True)
+            if i == groupchat.max_round - 1:
+                break
+            if speaker in turns[:-1]:
+                speaker = turns[turns.index(speaker) + 1]
+                reply = await speaker.a_generate_reply(sender=self)
+            elif speaker is self.aggregator and turns:
+                speaker = turns[0]
+                reply = await speaker.a_generate_reply(sender=self)
+            else:
+                speaker = self.aggregator
+                reply = await self._a_broadcast_round(message)
+            if reply is None:
+                break
+            await speaker.a_send(reply, self, request_reply=False)
+            message = self.last_message(speaker)
+        return True, None
+
+    async def _a_broadcast_round(self, message):
+        started = time.perf_counter()
+        replies = await asyncio.gather(*(self._a_answer(agent) for agent in self.responders))
+        answers = []
+        for agent, reply in zip(self.responders, replies):
+            if reply is None:
+                continue
+            await agent.a_send(reply, self, request_reply=False)
+            answers.append(f"{agent.name}:\n{self.last_message(agent).get('content') or ''}")
+        logger.info(f"{len(answers)} broadcast answers took {time.perf_counter() - started:.2f}s")
+        if not answers:
+            return None
+        prompt = (f"Message:\n{message.get('content') or ''}\n\nAnswers:\n\n" + "\n\n".join(answers))
+        return await self.aggregator.a_generate_reply(messages=[{"role": "user", "content": prompt}], sender=self)
+
+    async def _a_answer(self, agent):
+        with quiet_streams():
+            return await agent.a_generate_reply(sender=self)
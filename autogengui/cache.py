@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "AUTOGENGUI_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "autogengui"),
+)
+# Part of every key; bump it when extraction output changes so old text is not served.
+EXTRACTION_VERSION = 2
+
+
+class DocumentCache:
+    """Memory + disk LRU cache of extracted document text.
+
+    Local files are keyed by absolute path, size and mtime so an edited file is
+    re-extracted; downloaded documents are keyed by a hash of their content.
+    """
+
+    def __init__(self, cache_dir=None, max_memory_chars=64 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024):
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, "text")
+        self.max_memory_chars = max_memory_chars
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_chars = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_key(path):
+        stat = os.stat(path)
+        raw = f"{EXTRACTION_VERSION}\0{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def content_key(data):
+        return hashlib.sha256(b"%d\0%b" % (EXTRACTION_VERSION, data)).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        disk_path = self._disk_path(key)
+        try:
+            with open(disk_path, "r", encoding="utf-8") as file:
+                text = file.read()
+            os.utime(disk_path)  # mtime doubles as the disk LRU clock
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Ignoring unreadable cache entry {disk_path}: {e}")
+            return None
+
+        self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        self._remember(key, text)
+
+        disk_path = self._disk_path(key)
+        temp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                file.write(text)
+            os.replace(temp_path, disk_path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {disk_path}: {e}")
+            return
+        self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_chars = 0
+        for name in os.listdir(self.cache_dir):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def _remember(self, key, text):
+        if len(text) > self.max_memory_chars:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_chars -= len(self._memory.pop(key))
+            self._memory[key] = text
+            self._memory_chars += len(text)
+            while self._memory_chars > self.max_memory_chars:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_chars -= len(evicted)
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".txt"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total <= self.max_disk_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
@@ -0,0 +1,172 @@
+import logging
+import os
+import signal
+import subprocess
+from hashlib import md5
+from pathlib import Path
+
+import autogen
+from autogen.code_utils import PYTHON_VARIANTS, TIMEOUT_MSG, WIN32, get_powershell_command
+from autogen.coding import LocalCommandLineCodeExecutor
+from autogen.coding.base import CommandLineCodeResult
+from autogen.coding.utils import filename_patterns, silence_pip
+
+from autogengui.jobs import check_cancelled, current_job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TURN_TIMEOUT = 120  # seconds one model call may take
+# execute_code_blocks below mirrors LocalCommandLineCodeExecutor's block handling
+# in this pyautogen release, which the apps' requirements pin.
+MIRRORED_AUTOGEN_VERSION = "0.2.27"
+
+
+def with_turn_timeout(llm_config, seconds=DEFAULT_TURN_TIMEOUT):
+    """A copy of `llm_config` whose model calls are abandoned after `seconds`."""
+    return {**llm_config, "timeout": seconds}
+
+
+def _check_before_reply(messages):
+    check_cancelled()
+    return messages
+
+
+def _check_before_send(sender, message, recipient, silent):
+    check_cancelled()
+    return message
+
+
+def watch_cancellation(*agents):
+    """Makes each agent stop the chat of a cancelled job before replying or sending."""
+    for agent in agents:
+        for hookable_method, hook in (("process_all_messages_before_reply", _check_before_reply),
+                                      ("process_message_before_send", _check_before_send)):
+            if hook not in agent.hook_lists[hookable_method]:
+                agent.register_hook(hookable_method, hook)
+
+
+def _kill(process):
+    if process.poll() is not None:
+        return
+    try:
+        if WIN32:
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)  # the whole group: shells start children
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class CancellableCodeExecutor(LocalCommandLineCodeExecutor):
+    """LocalCommandLineCodeExecutor that kills the running code when its job is cancelled.
+
+    Runs code blocks like the parent, except that each block runs in its own
+    process group so the commands a script starts are killed with it. The
+    parent launches code from a private method, so its file naming and
+    interpreter choice are mirrored here from MIRRORED_AUTOGEN_VERSION; a
+    different pyautogen is logged as it may name or run blocks differently.
+    Executor functions are not supported.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get("functions"):
+            raise ValueError("CancellableCodeExecutor does not support functions")
+        if autogen.__version__ != MIRRORED_AUTOGEN_VERSION:
+            logger.warning(f"CancellableCodeExecutor mirrors pyautogen {MIRRORED_AUTOGEN_VERSION}'s code execution, "
+                           f"but {autogen.__version__} is installed")
+        super().__init__(*args, **kwargs)
+
+    def execute_code_blocks(self, code_blocks):
+        logs_all = ""
+        file_names = []
+        exitcode = 0
+        for code_block in code_blocks:
+            lang, code = code_block.language.lower(), code_block.code
+
+            self.sanitize_command(lang, code)
+            code = silence_pip(code, lang)
+
+            if lang in PYTHON_VARIANTS:
+                lang = "python"
+            if WIN32 and lang in ["sh", "shell"]:
+                lang = "ps1"
+            if lang not in self.SUPPORTED_LANGUAGES:
+                exitcode = 1
+                logs_all += "\n" + f"unknown language {lang}"
+                break
+
+            try:
+                filename = _file_name_from_content(code, self.work_dir)
+            except ValueError:
+                return CommandLineCodeResult(exit_code=1, output="Filename is not in the workspace")
+            if filename is None:
+                code_hash = md5(code.encode()).hexdigest()
+                filename = f"tmp_code_{code_hash}.{'py' if lang.startswith('python') else lang}"
+            written_file = (self.work_dir / filename).resolve()
+            with written_file.open("w", encoding="utf-8") as f:
+                f.write(code)
+            file_names.append(written_file)
+
+            if not self.execution_policies.get(lang, False):
+                logs_all += f"Code saved to {str(written_file)}\n"
+                exitcode = 0
+                continue
+
+            exitcode, output = self._run_command([_interpreter(lang), str(written_file.absolute())])
+            logs_all += output
+            if exitcode != 0:
+                break
+
+        code_file = str(file_names[0]) if len(file_names) > 0 else None
+        return CommandLineCodeResult(exit_code=exitcode, output=logs_all, code_file=code_file)
+
+    def _run_command(self, cmd):
+        check_cancelled()
+        process = subprocess.Popen(cmd, cwd=self.work_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, start_new_session=not WIN32)
+        job = current_job()
+
+        def kill():
+            _kill(process)
+
+        if job is not None:
+            job.add_cancel_callback(kill)
+        try:
+            stdout, stderr = process.communicate(timeout=float(self.timeout))
+        except subprocess.TimeoutExpired:
+            _kill(process)
+            process.communicate()
+            # Same exit code as the timeout command on linux.
+            return 124, "\n" + TIMEOUT_MSG
+        finally:
+            if job is not None:
+                job.remove_cancel_callback(kill)
+        check_cancelled()
+        return process.returncode, stderr + stdout
+
+
+def _interpreter(lang):
+    # The command autogen runs each supported language with.
+    if lang == "python":
+        return "python"
+    if lang.startswith("python") or lang in ["bash", "sh"]:
+        return lang
+    if lang == "shell":
+        return "sh"
+    if lang in ["ps1", "pwsh", "powershell"]:
+        return get_powershell_command()
+    raise NotImplementedError(f"{lang} not recognized in code execution")
+
+
+def _file_name_from_content(code, work_dir):
+    """The workspace-relative file name a block names on its first line ("# filename: x.py"), or None."""
+    first_line = code.split("\n")[0].strip()
+    for pattern in filename_patterns:
+        match = pattern.match(first_line)
+        if match is not None:
+            path = Path(match.group(2).strip())
+            if not path.is_absolute():
+                path = work_dir / path
+            # relative_to raises ValueError for a file outside the workspace.
+            return str(path.resolve().relative_to(Path(work_dir).resolve()))
+    return None
@@ -0,0 +1,83 @@
+import re
+from collections import Counter
+
+PAGE_BREAK = '\f'
+EDGE_LINES = 3  # running headers/footers are looked for this many lines from each page edge
+
+_PAGE_NUMBER_RE = re.compile(r'^(?:page\s*)?[-–—]?\s*\d{1,4}\s*[-–—]?(?:\s*(?:of|/)\s*\d{1,4})?$', re.IGNORECASE)
+# Page numbers inside a running header/footer: "Page 3", "3 of 40", or a
+# number set off from the title by a separator or a wide gap ("Report | 3").
+_PAGE_REF_RE = re.compile(r'\bpage\s*\d{1,4}(?:\s*(?:of|/)\s*\d{1,4})?\b|\b\d{1,4}\s*(?:of|/)\s*\d{1,4}\b'
+                          r'|(?:[|·•–—-]|\s{2})\s*\d{1,4}$|^\d{1,4}\s*(?:[|·•–—-]|\s{2})', re.IGNORECASE)
+_DIGITS_RE = re.compile(r'\d+')
+_HYPHEN_BREAK_RE = re.compile(r'(\w)-\n[ \t]*([a-z])')
+_SPACES_RE = re.compile(r'[ \t\u00a0]+')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+
+def _signature(line):
+    # "Page 3 of 40" and "Page 4 of 40" are the same running footer, but
+    # "Figure 3" and "Figure 4" are different lines.
+    line = _PAGE_REF_RE.sub(lambda match: _DIGITS_RE.sub('#', match.group()), line.strip())
+    return ' '.join(line.split()).lower()
+
+
+def _edge_lines(lines):
+    """(edge position, line number) of the text lines a running header or footer could be.
+
+    Positions are 0, 1, ... from the top and -1, -2, ... from the bottom.
+    Pages with too few lines to have a header and footer apart from the body
+    have none.
+    """
+    text_numbers = [number for number, line in enumerate(lines) if line.strip()]
+    if len(text_numbers) <= 2 * EDGE_LINES:
+        return []
+    top = list(enumerate(text_numbers[:EDGE_LINES]))
+    bottom = [(-1 - i, number) for i, number in enumerate(reversed(text_numbers[-EDGE_LINES:]))]
+    return top + bottom
+
+
+def _repeated_edge_lines(pages, min_share=0.5):
+    """(edge position, signature) pairs that recur on at least `min_share` of the pages with edges."""
+    edges = [_edge_lines(lines) for lines in pages]
+    counted = [(lines, page_edges) for lines, page_edges in zip(pages, edges) if page_edges]
+    if len(counted) < 3:
+        return set()
+    counts = Counter()
+    for lines, page_edges in counted:
+        counts.update({(position, _signature(lines[number])) for position, number in page_edges})
+    threshold = max(2, int(len(counted) * min_share))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def compress_pages(pages):
+    """Strips extraction boilerplate from the text of a document's pages and joins them.
+
+    Drops running headers and footers (lines repeated at the same place near
+    the top or bottom of most pages, ignoring page numbers in them) and bare
+    page numbers, rejoins words hyphenated across line breaks and collapses
+    runs of whitespace.
+    """
+    pages = [page.splitlines() for page in pages]
+    repeated = _repeated_edge_lines(pages)
+    kept_pages = []
+    for lines in pages:
+        dropped = set()
+        for position, number in _edge_lines(lines):
+            stripped = lines[number].strip()
+            if _PAGE_NUMBER_RE.match(stripped) or (position, _signature(stripped)) in repeated:
+                dropped.add(number)
+        kept_pages.append('\n'.join(line for number, line in enumerate(lines) if number not in dropped))
+    return compress_text('\n'.join(kept_pages))
+
+
+def compress_text(text):
+    text = _HYPHEN_BREAK_RE.sub(r'\1\2', text)
+    text = _SPACES_RE.sub(' ', text)
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return _BLANK_LINES_RE.sub('\n\n', text).strip()
+
+
+def compress_paged_text(text):
+    """compress_pages() for text whose pages are separated by PAGE_BREAK."""
+    return compress_pages(text.split(PAGE_BREAK))
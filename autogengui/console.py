@@ -0,0 +1,228 @@
+import collections
+import glob
+import logging
+import os
+import time
+import tkinter as tk
+from array import array
+
+from autogengui.cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRAME_RATE = 30  # output refreshes per second
+RATE_WINDOW = 2.0  # seconds of history behind lines_per_second
+DEFAULT_MAX_LINES = 5000
+DEFAULT_PAGE_LINES = 1000
+MAX_TRANSCRIPTS = 20  # per app; older ones are deleted
+
+
+def default_transcript_path(app_name):
+    """A new transcript file for this run of `app_name`, pruning the oldest ones."""
+    directory = os.path.join(DEFAULT_CACHE_DIR, "transcripts")
+    os.makedirs(directory, exist_ok=True)
+    existing = sorted(glob.glob(os.path.join(directory, f"{app_name}-*.log")))
+    for old in existing[:max(0, len(existing) - MAX_TRANSCRIPTS + 1)]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return os.path.join(directory, f"{app_name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.log")
+
+
+def _insert_args(segments):
+    """Text.insert arguments for [text, tag] segments: text, tags, text, tags, ..."""
+    args = []
+    for text, tag in segments:
+        args += [text, (tag,) if tag else ()]
+    return args
+
+
+class TextRedirector:
+    """stdout/stderr replacement that can be written from any thread.
+
+    write() only appends to a deque (thread-safe without a lock); the Tk main
+    loop drains it `frame_rate` times a second and inserts everything that
+    arrived since the last frame with a single insert/see. Install one
+    instance for both streams so their output stays in order. write_tagged()
+    queues text that should carry a Text widget tag (e.g. a colour).
+    """
+
+    def __init__(self, text_widget, frame_rate=DEFAULT_FRAME_RATE):
+        self.text_widget = text_widget
+        self.interval = max(1, round(1000 / frame_rate))
+        self.total_lines = 0
+        self.peak_lines_per_second = 0.0
+        self._pending = collections.deque()
+        self._recent = collections.deque()  # (time, lines) per non-empty frame
+        self.text_widget.after(self.interval, self._drain)
+
+    def write(self, string):
+        if string:
+            self._pending.append((string, None))
+
+    def write_tagged(self, string, tag):
+        if string:
+            self._pending.append((string, tag))
+
+    def flush(self):
+        pass
+
+    @property
+    def lines_per_second(self):
+        """Lines inserted per second over the last RATE_WINDOW seconds."""
+        cutoff = time.monotonic() - RATE_WINDOW
+        return sum(lines for at, lines in self._recent if at >= cutoff) / RATE_WINDOW
+
+    def stats(self):
+        return (f"{self.total_lines} lines, {self.lines_per_second:.0f} lines/s "
+                f"(peak {self.peak_lines_per_second:.0f} lines/s)")
+
+    def _drain(self):
+        segments = []  # [text, tag] with runs of the same tag merged
+        while self._pending:
+            string, tag = self._pending.popleft()
+            if segments and segments[-1][1] == tag:
+                segments[-1][0] += string
+            else:
+                segments.append([string, tag])
+        try:
+            if segments:
+                self._insert(segments)
+                self._record(sum(text.count('\n') for text, _ in segments))
+            self.text_widget.after(self.interval, self._drain)
+        except tk.TclError:
+            pass  # window closed; stop draining
+
+    def _insert(self, segments):
+        self.text_widget.insert(tk.END, *_insert_args(segments))
+        self.text_widget.see(tk.END)
+
+    def _record(self, lines):
+        now = time.monotonic()
+        self.total_lines += lines
+        self._recent.append((now, lines))
+        while self._recent and self._recent[0][0] < now - RATE_WINDOW:
+            self._recent.popleft()
+        rate = self.lines_per_second
+        if rate > self.peak_lines_per_second:
+            self.peak_lines_per_second = rate
+            logger.debug(f"Output throughput peak: {rate:.0f} lines/s")
+
+
+class BoundedTextRedirector(TextRedirector):
+    """TextRedirector that keeps at most `max_lines` lines in the widget.
+
+    Everything written is appended to an on-disk transcript with an index of
+    line offsets. While the view follows the output, lines scrolled off the
+    top are dropped from the widget; scrolling to the top or bottom edge pages
+    `page_lines` lines back in from the transcript (dropping lines at the far
+    end). New output is not shown while older pages are in view and appears
+    again once the user scrolls back down to it. Pages read back from the
+    transcript are plain text; write_tagged() tags only survive while shown.
+    """
+
+    def __init__(self, text_widget, transcript_path, max_lines=DEFAULT_MAX_LINES, page_lines=DEFAULT_PAGE_LINES,
+                 frame_rate=DEFAULT_FRAME_RATE):
+        super().__init__(text_widget, frame_rate)
+        self.transcript_path = transcript_path
+        self.max_lines = max_lines
+        self.page_lines = max(1, min(page_lines, max_lines // 2))
+        self._transcript = open(transcript_path, "w+b")
+        self._line_starts = array('q', [0])  # byte offset of every line in the transcript
+        self._size = 0
+        self._floor = 0  # first line still reachable after clear()
+        self._start, self._end = 0, 1  # transcript lines [start, end) are in the widget
+        self._paging = False
+        # Keep feeding the scrollbar (or whatever was attached) while watching the view.
+        self._chained_scroll = str(text_widget.cget("yscrollcommand"))
+        text_widget.config(yscrollcommand=self._on_scroll)
+
+    def clear(self):
+        """Empties the view; cleared output stays in the transcript but is no longer paged in."""
+        if self._line_starts[-1] != self._size:
+            self._append(b"\n")
+        self._floor = self._start = len(self._line_starts) - 1
+        self._end = len(self._line_starts)
+        self.text_widget.delete("1.0", tk.END)
+
+    def read_all(self):
+        """The whole output since the last clear(), including lines no longer in the widget."""
+        return self._read_lines(self._floor, len(self._line_starts))
+
+    def _insert(self, segments):
+        following = self._end == len(self._line_starts)
+        self._append(''.join(text for text, _ in segments).encode("utf-8"))
+        if not following:
+            return
+        self.text_widget.insert(tk.END, *_insert_args(segments))
+        self._end = len(self._line_starts)
+        excess = (self._end - self._start) - self.max_lines
+        if excess > 0:
+            self.text_widget.delete("1.0", f"{excess + 1}.0")
+            self._start += excess
+        self.text_widget.see(tk.END)
+
+    def _append(self, data):
+        self._transcript.seek(0, os.SEEK_END)
+        self._transcript.write(data)
+        index = data.find(b"\n")
+        while index != -1:
+            self._line_starts.append(self._size + index + 1)
+            index = data.find(b"\n", index + 1)
+        self._size += len(data)
+
+    def _read_lines(self, first, stop):
+        """Text of transcript lines [first, stop), without the newline that ends the last one."""
+        self._transcript.flush()
+        begin = self._line_starts[first]
+        end = self._line_starts[stop] - 1 if stop < len(self._line_starts) else self._size
+        self._transcript.seek(begin)
+        return self._transcript.read(max(0, end - begin)).decode("utf-8", errors="replace")
+
+    def _on_scroll(self, first, last):
+        if self._chained_scroll:
+            self.text_widget.tk.eval(f"{self._chained_scroll} {first} {last}")
+        if self._paging:
+            return
+        if float(first) <= 0.0 and self._start > self._floor:
+            page = self._page_back
+        elif float(last) >= 1.0 and self._end < len(self._line_starts):
+            page = self._page_forward
+        else:
+            return
+        self._paging = True
+        self.text_widget.after_idle(lambda: self._run_page(page))
+
+    def _run_page(self, page):
+        try:
+            page()
+        finally:
+            self._paging = False
+
+    def _page_back(self):
+        count = min(self.page_lines, self._start - self._floor)
+        if count <= 0:
+            return
+        self.text_widget.insert("1.0", self._read_lines(self._start - count, self._start) + "\n")
+        self._start -= count
+        excess = (self._end - self._start) - self.max_lines
+        if excess > 0:
+            self.text_widget.delete(f"{self.max_lines}.end", "end-1c")
+            self._end -= excess
+        # Keep the line the user was looking at in place.
+        self.text_widget.yview(f"{count + 1}.0")
+
+    def _page_forward(self):
+        count = min(self.page_lines, len(self._line_starts) - self._end)
+        if count <= 0:
+            return
+        bottom = self._end - self._start  # widget line that was at the bottom edge
+        self.text_widget.insert("end-1c", "\n" + self._read_lines(self._end, self._end + count))
+        self._end += count
+        excess = (self._end - self._start) - self.max_lines
+        if excess > 0:
+            self.text_widget.delete("1.0", f"{excess + 1}.0")
+            self._start += excess
+            bottom -= excess
+        self.text_widget.see(f"{max(bottom, 1)}.0")
@@ -0,0 +1,128 @@
+import logging
+
+from autogengui.cache import DocumentCache
+from autogengui.fetch import HttpFetcher
+from autogengui.formats import detect_format, format_for_extension
+from autogengui.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def parse_page_ranges(spec):
+    """Turns a 1-based page spec such as "1-3,7,10-" into 0-based (start, stop) ranges."""
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, _, stop = part.partition('-')
+            start = int(start) if start.strip() else 1
+            stop = int(stop) if stop.strip() else None
+        else:
+            start = stop = int(part)
+        if start < 1 or (stop is not None and stop < start):
+            raise ValueError(f"Invalid page range: {part}")
+        ranges.append((start - 1, stop))
+    return ranges
+
+
+def split_page_spec(path):
+    """Splits "manual.pdf#pages=10-20" into ("manual.pdf", [(9, 20)])."""
+    base, sep, fragment = path.partition('#pages=')
+    if not sep:
+        return path, None
+    return base, parse_page_ranges(fragment)
+
+
+class DocumentHandler:
+    def __init__(self, cache=None, parse_executor=None, fetcher=None):
+        self.cache = cache if cache is not None else DocumentCache()
+        self.fetcher = fetcher if fetcher is not None else HttpFetcher()
+        # Optional concurrent.futures executor (usually a process pool) that
+        # runs the CPU-bound parsing of binary formats off the calling thread.
+        self.parse_executor = parse_executor
+
+    def read_document(self, path):
+        try:
+            path, pages = split_page_spec(path)
+            if path.startswith('http://') or path.startswith('https://'):
+                return self._read_url_document(path, pages)
+            else:
+                return self._read_local_document(path, pages)
+        except Exception as e:
+            logger.error(f"Error reading document: {e}")
+            raise
+
+    def _read_url_document(self, url, pages=None):
+        with self.fetcher.get(url) as response:
+            key = self.cache.content_key(f"{url}\0{pages}\0{response.digest}".encode("utf-8"))
+            text = self.cache.get(key)
+            if text is not None:
+                return text
+
+            response.body.seek(0)
+            document_format = detect_format(url, response.content_type, response.body.read(512))
+            args = document_format.reader_args(pages, response.encoding)
+            if document_format.binary:
+                text = self._parse_download(document_format.reader, response, *args)
+            else:
+                response.body.seek(0)
+                text = document_format.reader(response.body, *args)
+            text = self._clean(document_format, url, text)
+
+        self.cache.put(key, text)
+        return text
+
+    def _read_local_document(self, path, pages=None):
+        key = self._local_key(path, pages)
+        text = self.cache.get(key)
+        if text is not None:
+            return text
+
+        document_format = self._local_format(path)
+        args = document_format.reader_args(pages)
+        if document_format.binary:
+            text = self._parse(document_format.reader, path, *args)
+        else:
+            text = document_format.reader(path, *args)
+        text = self._clean(document_format, path, text)
+
+        self.cache.put(key, text)
+        return text
+
+    @staticmethod
+    def _clean(document_format, name, text):
+        if document_format.cleaner is None:
+            return text
+        cleaned = document_format.cleaner(text)
+        before, after = count_tokens(text), count_tokens(cleaned)
+        if before:
+            logger.info(f"Compressed {name}: {before} -> {after} tokens ({100 * (before - after) // before}% saved)")
+        return cleaned
+
+    @staticmethod
+    def _local_format(path):
+        document_format = format_for_extension(path)
+        if document_format is None:
+            with open(path, 'rb') as file:
+                document_format = detect_format(path, head=file.read(512))
+        return document_format
+
+    def _local_key(self, path, pages):
+        key = self.cache.file_key(path)
+        if pages:
+            key = self.cache.content_key(f"{key}\0{pages}".encode("utf-8"))
+        return key
+
+    def _parse(self, reader, file_path, *args):
+        if self.parse_executor is None:
+            return reader(file_path, *args)
+        return self.parse_executor.submit(reader, file_path, *args).result()
+
+    def _parse_download(self, reader, response, *args):
+        # Worker processes can only be handed a path; spooled bodies are parsed here.
+        if self.parse_executor is not None and response.path is not None:
+            return self._parse(reader, response.path, *args)
+        response.body.seek(0)
+        return reader(response.body, *args)
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import threading
+import time
+
+from autogen import Cache, ConversableAgent, OpenAIWrapper
+from autogen.io import IOStream
+from autogen.oai.client import LEGACY_CACHE_DIR, LEGACY_DEFAULT_CACHE_SEED
+from autogen.oai.openai_utils import get_key
+from openai import APIError, AsyncOpenAI
+
+from autogengui.jobs import (DEFAULT_MAX_PENDING, DEFAULT_REQUEST_TIMEOUT, DONE, FAILED, QUEUED, RUNNING, JobQueue,
+                             _current_job)
+from autogengui.streaming import STREAM_END, STREAM_START
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENT_CHATS = 32
+# Keeps cached reply messages apart from the completions autogen's sync client caches.
+CACHE_KEY_PREFIX = "autogengui-async-reply:"
+
+# Sync reply functions that block for as long as the code they run.
+_BLOCKING_REPLIES = (
+    ConversableAgent._generate_code_execution_reply_using_executor,
+    ConversableAgent.generate_code_execution_reply,
+)
+
+
+class ChatEngine(JobQueue):
+    """JobQueue whose chats are asyncio tasks on a single event-loop thread.
+
+    Jobs are coroutine functions, run(prompt) -> awaitable, that drive autogen's
+    async API (a_initiate_chat); give their agents use_async_replies() so model
+    calls and code execution do not block the loop. Requests are queued,
+    serialized per session, listed and cancelled exactly as with JobQueue, but
+    up to `max_chats` of them share the one thread. Cancelling a job cancels
+    its task, which aborts the model request it is waiting on at once.
+    """
+
+    def __init__(self, max_chats=DEFAULT_CONCURRENT_CHATS, max_pending=DEFAULT_MAX_PENDING, on_change=None,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT):
+        super().__init__(max_workers=1, max_pending=max_pending, on_change=on_change,
+                         request_timeout=request_timeout)
+        self._loop = asyncio.new_event_loop()
+        self._slots = asyncio.Semaphore(max_chats)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="chat-engine", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        super().shutdown()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _start(self, job):
+        asyncio.run_coroutine_threadsafe(self._run_task(job), self._loop)
+
+    async def _run_task(self, job):
+        async with self._slots:
+            with self._lock:
+                start = job.state == QUEUED
+                if start:
+                    job.state = RUNNING
+                    job.started = time.monotonic()
+            if not start:  # cancelled while it waited
+                self._release(job)
+                return
+            self._notify(job)
+            await self._chat_task(job)
+
+    async def _chat_task(self, job):
+        _current_job.set(job)
+        task = asyncio.current_task()
+
+        def stop():
+            self._loop.call_soon_threadsafe(task.cancel, job.cancel_reason)
+
+        job.add_cancel_callback(stop)
+        deadline = None
+        if self.request_timeout:
+            deadline = self._loop.call_later(self.request_timeout, self.cancel, job,
+                                             f"timed out after {self.request_timeout}s")
+        try:
+            result = await job.run(job.prompt)
+            with self._lock:
+                if job.state == RUNNING:
+                    job.result = result
+                    job.state = DONE
+        except asyncio.CancelledError:
+            logger.debug(f"Job #{job.id} cancelled: {job.cancel_reason}")
+        except Exception as e:
+            with self._lock:
+                if job.state == RUNNING:
+                    job.error = e
+                    job.state = FAILED
+            logger.debug(f"Job #{job.id} ended: {e}")
+        finally:
+            if deadline is not None:
+                deadline.cancel()
+            job.remove_cancel_callback(stop)
+            with self._lock:
+                if job.finished is None:
+                    job.finished = time.monotonic()
+            job._settled.set()
+            self._release(job)
+
+
+def use_async_replies(*agents):
+    """Makes each agent's replies in async chats wait without blocking the event loop.
+
+    Model calls go through AsyncOpenAI instead of autogen's sync client on a
+    thread pool, and code blocks run on a worker thread. Sync chats (such as
+    nested chats) are unaffected. Configs with an api_type other than openai
+    keep autogen's own async reply.
+    """
+    for agent in agents:
+        replies = [entry["reply_func"] for entry in agent._reply_func_list]
+        if agent.llm_config and not any(isinstance(getattr(reply, "__self__", None), AsyncOpenAIReply)
+                                        for reply in replies):
+            _register_before(agent, AsyncOpenAIReply().generate_reply, ConversableAgent.a_generate_oai_reply)
+        for blocking in _BLOCKING_REPLIES:
+            if blocking in replies and not any(getattr(reply, "blocking", None) is blocking for reply in replies):
+                _register_before(agent, _in_thread(blocking), blocking)
+
+
+def _register_before(agent, reply_func, existing):
+    # Replies are tried in list order; taking the place of `existing` keeps autogen's precedence.
+    position = [entry["reply_func"] for entry in agent._reply_func_list].index(existing)
+    agent.register_reply([ConversableAgent, None], reply_func, position=position, ignore_async_in_sync_chat=True)
+
+
+def _in_thread(reply_func):
+    async def reply(recipient, messages=None, sender=None, config=None):
+        return await asyncio.to_thread(reply_func, recipient, messages=messages, sender=sender, config=config)
+
+    reply.blocking = reply_func
+    return reply
+
+
+class AsyncOpenAIReply:
+    """Async reply function (generate_reply) that asks the model through AsyncOpenAI.
+
+    Follows autogen's generate_oai_reply: the agent's current llm_config is
+    read on every call and its configs are tried in order, streamed
+    completions are printed between the same colour codes (so StreamingOutput
+    labels them), and tool or function calls are returned as message dicts.
+    Replies are cached as autogen caches them, in the chat's cache or else the
+    disk cache for the config's cache_seed, under keys of their own (autogen
+    stores whole completions, this stores the reply message). A cached reply
+    is not printed as a stream. Configs with an api_type other than openai
+    are left to autogen's own async reply.
+    """
+
+    def __init__(self):
+        self._clients = {}  # client settings -> AsyncOpenAI, reused across calls
+
+    async def generate_reply(self, recipient, messages=None, sender=None, config=None):
+        configs = self._configs(recipient.llm_config)
+        if not configs:
+            return False, None
+        if messages is None:
+            messages = recipient._oai_messages[sender]
+        messages = _unroll_tool_responses(recipient._oai_system_message + messages)
+        for i, (client, params, cache) in enumerate(configs):
+            try:
+                message = await self._cached_create(client, {**params, "messages": messages},
+                                                    recipient.client_cache or cache)
+                break
+            except APIError as e:
+                if i == len(configs) - 1:
+                    raise
+                logger.debug(f"Model config {i} failed, trying the next: {e}")
+        if message.get("tool_calls") or message.get("function_call"):
+            if message.get("function_call"):
+                message["function_call"]["name"] = recipient._normalize_name(message["function_call"]["name"])
+            for tool_call in message.get("tool_calls") or []:
+                tool_call["function"]["name"] = recipient._normalize_name(tool_call["function"]["name"])
+            return True, message
+        return True, message.get("content")
+
+    def _configs(self, llm_config):
+        """(client, create params, disk cache) per config, or [] when autogen has to handle the call."""
+        if not llm_config:
+            return []
+        configs = []
+        base_config = {k: v for k, v in llm_config.items() if k != "config_list"}
+        for config in llm_config.get("config_list") or [{}]:
+            config = {**base_config, **config}
+            if config.get("api_type", "openai") != "openai":
+                return []
+            client_kwargs = {k: v for k, v in config.items() if k in OpenAIWrapper.openai_kwargs}
+            client_key = repr(sorted(client_kwargs.items()))
+            client = self._clients.get(client_key)
+            if client is None:
+                client = self._clients[client_key] = AsyncOpenAI(**client_kwargs)
+            params = {k: v for k, v in config.items()
+                      if k not in OpenAIWrapper.openai_kwargs and k not in OpenAIWrapper.extra_kwargs}
+            cache_seed = config.get("cache_seed", LEGACY_DEFAULT_CACHE_SEED)
+            cache = config.get("cache")
+            if cache is None and cache_seed is not None:
+                cache = Cache.disk(cache_seed, LEGACY_CACHE_DIR)
+            configs.append((client, params, cache))
+        return configs
+
+    @classmethod
+    async def _cached_create(cls, client, params, cache):
+        if cache is None:
+            return await cls._create(client, params)
+        key = f"{CACHE_KEY_PREFIX}{get_key(params)}"
+        with cache:
+            message = await asyncio.to_thread(cache.get, key)
+            if message is not None:
+                return message
+            message = await cls._create(client, params)
+            await asyncio.to_thread(cache.set, key, message)
+        return message
+
+    @staticmethod
+    async def _create(client, params):
+        if not params.get("stream"):
+            response = await client.chat.completions.create(**params)
+            return response.choices[0].message.model_dump(exclude_none=True)
+        iostream = IOStream.get_default()
+        iostream.print(STREAM_START, end="")
+        content = ""
+        function_call = None
+        tool_calls = []
+        completion_tokens = 0
+        async for chunk in await client.chat.completions.create(**params):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if getattr(delta, "function_call", None):
+                function_call, completion_tokens = OpenAIWrapper._update_function_call_from_chunk(
+                    delta.function_call, function_call, completion_tokens)
+            for tool_call in delta.tool_calls or []:
+                if tool_call.index >= len(tool_calls):
+                    tool_calls += [None] * (tool_call.index - len(tool_calls) + 1)
+                tool_calls[tool_call.index], completion_tokens = OpenAIWrapper._update_tool_calls_from_chunk(
+                    tool_call, tool_calls[tool_call.index], completion_tokens)
+            if delta.content:
+                iostream.print(delta.content, end="", flush=True)
+                content += delta.content
+        iostream.print(f"{STREAM_END}\n")
+        message = {"role": "assistant", "content": content}
+        if function_call:
+            message["function_call"] = function_call
+        if tool_calls:
+            message["tool_calls"] = [{k: v for k, v in call.items() if k != "index"} for call in tool_calls]
+        return message
+
+
+def _unroll_tool_responses(messages):
+    # As autogen does before sending: tool results go to the model as their own messages.
+    unrolled = []
+    for message in messages:
+        tool_responses = message.get("tool_responses", [])
+        if tool_responses:
+            unrolled += tool_responses
+            if message.get("role") != "tool":
+                unrolled.append({key: message[key] for key in message if key != "tool_responses"})
+        else:
+            unrolled.append(message)
+    return unrolled
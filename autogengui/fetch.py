@@ -0,0 +1,245 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from autogengui.cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_SPOOL_BYTES = 8 * 1024 * 1024
+DEFAULT_MAX_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+class DownloadTooLarge(ValueError):
+    pass
+
+
+class FetchResult:
+    """A downloaded body as a file object; close it (or use `with`) to release it.
+
+    `path` is set when the body is a file in the HTTP cache, which lets a
+    process pool open it by name instead of receiving the bytes.
+    """
+
+    def __init__(self, url, body, digest, encoding=None, content_type=None, not_modified=False, path=None):
+        self.url = url
+        self.body = body
+        self.digest = digest
+        self.encoding = encoding
+        self.content_type = content_type
+        self.not_modified = not_modified
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.body.close()
+
+    @property
+    def text(self):
+        self.body.seek(0)
+        return self.body.read().decode(self.encoding or "utf-8", errors="replace")
+
+
+class HttpFetcher:
+    """Shared keep-alive session that revalidates URLs with conditional GETs.
+
+    The last body of every URL is kept on disk with its ETag/Last-Modified, so
+    refreshing an unchanged document costs one small 304 round-trip. Bodies
+    are evicted least recently used first once they take up more than
+    `max_cache_bytes`.
+    """
+
+    def __init__(self, cache_dir=None, timeout=DEFAULT_TIMEOUT, pool_size=16,
+                 max_bytes=DEFAULT_MAX_BYTES, spool_bytes=DEFAULT_SPOOL_BYTES, max_cache_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, "http")
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.max_cache_bytes = max_cache_bytes
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, url):
+        meta_path, body_path = self._paths(url)
+        meta = self._load_meta(meta_path)
+        headers = {}
+        if meta is not None and os.path.exists(body_path):
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and headers:
+                try:
+                    body = open(body_path, "rb")
+                except OSError:
+                    pass  # evicted between the check and now; fall through to a full GET
+                else:
+                    _touch(body_path)  # mtime doubles as the LRU clock
+                    return FetchResult(url, body, meta["digest"], meta.get("encoding"), meta.get("content_type"),
+                                       not_modified=True, path=body_path)
+            if response.status_code != 304:
+                return self._download(url, response, meta_path, body_path)
+
+        with self.session.get(url, timeout=self.timeout, stream=True) as response:
+            return self._download(url, response, meta_path, body_path)
+
+    def validators(self, url):
+        """The (ETag, Last-Modified) of the cached body of `url`, or (None, None)."""
+        meta = self._load_meta(self._paths(url)[0])
+        if meta is None:
+            return None, None
+        return meta.get("etag"), meta.get("last_modified")
+
+    def revalidate(self, url, etag=None, last_modified=None):
+        """True if the server answers a conditional GET for `url` with 304 Not Modified."""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        if not headers:
+            return False
+        try:
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                return response.status_code == 304
+        except requests.RequestException as e:
+            logger.debug(f"Could not revalidate {url}: {e}")
+            return False
+
+    def _download(self, url, response, meta_path, body_path):
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            raise DownloadTooLarge(f"{url} is {int(length)} bytes, over the {self.max_bytes} byte limit")
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        cacheable = bool(etag or last_modified)
+        # Revalidatable bodies go straight into the HTTP cache; the rest are
+        # spooled in memory and only hit the disk when they are large.
+        if cacheable:
+            temp_path = f"{body_path}.{threading.get_ident()}.tmp"
+            body = open(temp_path, "w+b")
+        else:
+            body = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            for block in response.iter_content(chunk_size=64 * 1024):
+                size += len(block)
+                if size > self.max_bytes:
+                    raise DownloadTooLarge(f"{url} exceeded the {self.max_bytes} byte limit")
+                digest.update(block)
+                body.write(block)
+        except BaseException:
+            body.close()
+            if cacheable:
+                _remove_quietly(temp_path)
+            raise
+
+        content_type = response.headers.get("Content-Type")
+        if not cacheable:
+            body.seek(0)
+            return FetchResult(url, body, digest.hexdigest(), response.encoding, content_type)
+
+        body.close()
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "digest": digest.hexdigest(),
+            "encoding": response.encoding,
+            "content_type": content_type,
+        }
+        try:
+            os.replace(temp_path, body_path)
+            self._save_meta(meta_path, meta)
+        except OSError as e:
+            logger.warning(f"Could not cache response for {url}: {e}")
+            _remove_quietly(temp_path)
+            raise
+        result = FetchResult(url, open(body_path, "rb"), meta["digest"], response.encoding, content_type,
+                             path=body_path)
+        self._evict(keep=body_path)
+        return result
+
+    def _evict(self, keep=None):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".body"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total <= self.max_cache_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if path == keep:
+                continue
+            # The metadata goes first, so a concurrent get() never revalidates a missing body.
+            _remove_quietly(f"{path[:-len('.body')]}.json")
+            _remove_quietly(path)
+            total -= size
+            if total <= self.max_cache_bytes:
+                break
+
+    def _paths(self, url):
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json"), os.path.join(self.cache_dir, f"{name}.body")
+
+    @staticmethod
+    def _load_meta(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return meta if "digest" in meta else None
+
+    @staticmethod
+    def _save_meta(meta_path, meta):
+        temp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(temp_path, meta_path)
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,185 @@
+import csv
+import io
+import mimetypes
+import os
+from html.parser import HTMLParser
+
+from autogengui.compress import PAGE_BREAK, compress_paged_text
+
+
+class DocumentFormat:
+    """A readable document type and the function that extracts its text.
+
+    `reader` takes a path or a binary file object. Parser libraries are
+    imported inside the reader, so a format costs nothing until the first
+    document of that type is read. Text readers also take the document's
+    encoding; binary readers are library parsers worth running in a process
+    pool, and `paged` ones take a page selection instead. `cleaner` is an
+    optional pass over the reader's output that strips extraction boilerplate.
+    """
+
+    def __init__(self, name, reader, extensions=(), mime_types=(), binary=False, paged=False, cleaner=None):
+        self.name = name
+        self.reader = reader
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.mime_types = tuple(mime_types)
+        self.binary = binary
+        self.paged = paged
+        self.cleaner = cleaner
+
+    def __repr__(self):
+        return f"DocumentFormat({self.name!r})"
+
+    def reader_args(self, pages=None, encoding=None):
+        if self.paged:
+            return (pages,)
+        return () if self.binary else (encoding,)
+
+
+_formats = {}
+_by_extension = {}
+_by_mime_type = {}
+# (prefix, format) pairs for bodies served as application/octet-stream and the like.
+_signatures = []
+
+
+def register_format(document_format, signatures=()):
+    """Adds (or replaces) a format; later registrations win for shared extensions and MIME types.
+
+    `signatures` are lowercase byte prefixes that identify the format when
+    neither the extension nor the MIME type does.
+    """
+    _formats[document_format.name] = document_format
+    for extension in document_format.extensions:
+        _by_extension[extension] = document_format
+    for mime_type in document_format.mime_types:
+        _by_mime_type[mime_type] = document_format
+    for signature in signatures:
+        _signatures.append((signature, document_format))
+    return document_format
+
+
+def get_format(name):
+    return _formats[name]
+
+
+def supported_extensions():
+    return set(_by_extension)
+
+
+def format_for_extension(path):
+    """The format registered for the path's extension, or None."""
+    extension = os.path.splitext(path.split('?', 1)[0].split('#', 1)[0])[1].lower()
+    return _by_extension.get(extension)
+
+
+def detect_format(path, content_type=None, head=None):
+    """Picks the format for a document from its extension, MIME type or first bytes.
+
+    `content_type` is an HTTP Content-Type header and `head` the start of the
+    body; both are only consulted when the extension is unknown, since many
+    servers send generic types. Unrecognised documents are read as text.
+    """
+    document_format = format_for_extension(path)
+    if document_format is not None:
+        return document_format
+
+    if content_type:
+        mime_type = content_type.split(';', 1)[0].strip().lower()
+        if mime_type in _by_mime_type:
+            return _by_mime_type[mime_type]
+    if head:
+        head = head.lstrip().lower()
+        for signature, document_format in _signatures:
+            if head.startswith(signature):
+                return document_format
+
+    guessed, _ = mimetypes.guess_type(path)
+    return _by_mime_type.get(guessed, _formats["text"])
+
+
+def _read_bytes(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            return file.read()
+    return source.read()
+
+
+def read_text(source, encoding=None):
+    return _read_bytes(source).decode(encoding or 'utf-8', errors='replace')
+
+
+def iter_pdf_pages(source, pages=None):
+    """Yields the text of each selected page without building the whole document."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(source)
+    page_count = len(reader.pages)
+    for start, stop in pages or [(0, None)]:
+        for index in range(start, min(stop or page_count, page_count)):
+            yield reader.pages[index].extract_text() or ''
+
+
+def read_pdf(source, pages=None):
+    # Page breaks are kept so the cleaner can spot running headers and footers.
+    return PAGE_BREAK.join(iter_pdf_pages(source, pages))
+
+
+def read_docx(source):
+    from docx import Document
+
+    doc = Document(source)
+    return '\n'.join([para.text for para in doc.paragraphs])
+
+
+class _HTMLText(HTMLParser):
+    _skipped = {'script', 'style', 'noscript', 'template'}
+    _blocks = {'p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'section', 'article'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._skipped:
+            self._skipping += 1
+        elif tag in self._blocks:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self._skipped and self._skipping:
+            self._skipping -= 1
+        elif tag in self._blocks:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def read_html(source, encoding=None):
+    parser = _HTMLText()
+    parser.feed(read_text(source, encoding))
+    parser.close()
+    lines = (' '.join(line.split()) for line in ''.join(parser.parts).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def read_csv(source, encoding=None):
+    rows = csv.reader(io.StringIO(read_text(source, encoding), newline=''))
+    return '\n'.join(' | '.join(cell.strip() for cell in row) for row in rows if any(cell.strip() for cell in row))
+
+
+register_format(DocumentFormat('text', read_text, ('.txt', '.rst', '.json', '.py', '.log'),
+                               ('text/plain', 'application/json')))
+register_format(DocumentFormat('markdown', read_text, ('.md', '.markdown'), ('text/markdown', 'text/x-markdown')))
+register_format(DocumentFormat('html', read_html, ('.html', '.htm'), ('text/html', 'application/xhtml+xml')),
+                signatures=(b'<!doctype html', b'<html'))
+register_format(DocumentFormat('csv', read_csv, ('.csv',), ('text/csv',)))
+register_format(DocumentFormat('pdf', read_pdf, ('.pdf',), ('application/pdf',), binary=True, paged=True,
+                               cleaner=compress_paged_text),
+                signatures=(b'%pdf-',))
+register_format(DocumentFormat('docx', read_docx, ('.docx',),
+                               ('application/vnd.openxmlformats-officedocument.wordprocessingml.document',),
+                               binary=True))
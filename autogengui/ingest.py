@@ -0,0 +1,110 @@
+import glob
+import logging
+import os
+import threading
+
+from autogengui.formats import supported_extensions
+from autogengui.retrieval import source_fingerprint
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_DIRECTORIES = {'.git', '__pycache__', 'node_modules', '.venv', 'venv'}
+DEFAULT_POLL_INTERVAL = 5.0
+
+
+def _is_glob(entry):
+    return any(char in entry for char in '*?[')
+
+
+def _walk(directory):
+    extensions = supported_extensions()
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(name for name in dirnames if name not in SKIPPED_DIRECTORIES and not name.startswith('.'))
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in extensions:
+                yield os.path.join(dirpath, filename)
+
+
+def expand_sources(entries):
+    """Expands directories and glob patterns into individual document paths.
+
+    URLs and plain paths pass through unchanged; order follows the entries
+    and duplicates are dropped.
+    """
+    paths = []
+    seen = set()
+    for entry in entries:
+        if entry.startswith('http://') or entry.startswith('https://'):
+            matches = [entry]
+        elif _is_glob(entry):
+            matches = sorted(path for path in glob.glob(os.path.expanduser(entry), recursive=True) if os.path.isfile(path))
+        elif os.path.isdir(os.path.expanduser(entry)):
+            matches = _walk(os.path.expanduser(entry))
+        else:
+            matches = [entry]
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+class BackgroundIndexer:
+    """Indexes the corpus on a background thread and keeps it current.
+
+    set_sources() triggers an immediate re-index. Between triggers the thread
+    polls local files' size/mtime every `poll_interval` seconds and re-indexes
+    when anything was added, removed or modified; DocumentIndex.update then
+    only reads the files that actually changed.
+    """
+
+    def __init__(self, document_index, loader, on_progress=None, on_done=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.document_index = document_index
+        self.loader = loader
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.poll_interval = poll_interval
+        self._sources = []
+        self._snapshot = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, sources=None):
+        if sources is not None:
+            self._sources = list(sources)
+        self._thread = threading.Thread(target=self._run, name="document-indexer", daemon=True)
+        self._thread.start()
+        self._wake.set()
+
+    def set_sources(self, sources):
+        self._sources = list(sources)
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            triggered = self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self._poll(triggered)
+            except Exception as e:
+                logger.error(f"Background indexing failed: {e}")
+
+    def _poll(self, triggered):
+        paths = expand_sources(self._sources)
+        snapshot = {path: source_fingerprint(path) for path in paths}
+        if not triggered and snapshot == self._snapshot:
+            return
+        self._snapshot = snapshot
+
+        if self.on_progress is not None:
+            self.on_progress(0, len(paths))
+        failures = self.document_index.update(paths, self.loader, progress=self.on_progress)
+        if self.on_done is not None:
+            self.on_done(len(paths), failures)
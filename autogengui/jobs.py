@@ -0,0 +1,267 @@
+import collections
+import contextvars
+import itertools
+import logging
+import threading
+import time
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 10
+DEFAULT_REQUEST_TIMEOUT = 900  # seconds a whole request may run before it is cancelled
+FINISHED_HISTORY = 20  # finished jobs still listed
+PROMPT_PREVIEW = 60  # characters of the prompt shown per job
+
+# The job whose chat runs in this thread or asyncio task (and threads it hands work to).
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def current_job():
+    """The Job whose chat is running here, or None."""
+    return _current_job.get()
+
+
+def check_cancelled():
+    """Raises JobCancelled if the job running here has been cancelled."""
+    job = current_job()
+    if job is not None and job.cancelled.is_set():
+        raise JobCancelled(job.cancel_reason)
+
+
+class Job:
+    def __init__(self, job_id, prompt, session, run):
+        self.id = job_id
+        self.prompt = prompt
+        self.session = session
+        self.run = run
+        self.state = QUEUED
+        self.error = None
+        self.result = None
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.cancelled = threading.Event()
+        self.cancel_reason = None
+        self._settled = threading.Event()  # set once the job's worker may move on
+        self._cancel_callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def add_cancel_callback(self, callback):
+        """Calls `callback()` when the job is cancelled (at once if it already is)."""
+        with self._callbacks_lock:
+            if not self.cancelled.is_set():
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+
+    def remove_cancel_callback(self, callback):
+        with self._callbacks_lock:
+            if callback in self._cancel_callbacks:
+                self._cancel_callbacks.remove(callback)
+
+    def cancel(self, reason):
+        with self._callbacks_lock:
+            if self.cancelled.is_set():
+                return
+            self.cancel_reason = reason
+            self.cancelled.set()
+            callbacks, self._cancel_callbacks = self._cancel_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Cancelling job #{self.id} failed: {e}")
+
+    def describe(self):
+        prompt = " ".join(self.prompt.split())
+        if len(prompt) > PROMPT_PREVIEW:
+            prompt = prompt[:PROMPT_PREVIEW - 3] + "..."
+        if self.state in (DONE, FAILED) or (self.state == CANCELLED and self.started is not None):
+            state = f"{self.state} after {self.finished - self.started:.0f}s"
+        else:
+            state = self.state
+        line = f"#{self.id} [{state}] {prompt}"
+        if self.state == CANCELLED:
+            line += f" ({self.cancel_reason})"
+        elif self.error is not None:
+            line += f" ({self.error})"
+        return line
+
+
+class JobQueue:
+    """Runs chat requests on a bounded worker pool, one at a time per session.
+
+    A session is the object a chat mutates (the group chat manager or agent the
+    request talks to). Jobs for the same session run in the order they were
+    submitted, so two requests never share a message history at once; jobs for
+    different sessions run in parallel on up to `max_workers` threads. submit()
+    refuses new work once `max_pending` jobs are waiting. `on_change(job)` is
+    called from worker threads whenever a job changes state.
+
+    Each chat runs on its own daemon thread while a worker waits for it, so a
+    cancelled job (cancel(), or running past `request_timeout` seconds) is
+    finished at once. The chat thread stops at its next cancellation check
+    (see check_cancelled); until it has, it still counts against `max_workers`
+    and later jobs for the same session wait.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING, on_change=None,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.max_pending = max_pending
+        self.on_change = on_change
+        self.request_timeout = request_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chat")
+        self._chat_slots = threading.Semaphore(max_workers)  # live chat threads, cancelled ones included
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._sessions = {}  # id(session) -> deque of its unfinished jobs, running one first
+        self._active = []
+        self._finished = collections.deque(maxlen=FINISHED_HISTORY)
+
+    def submit(self, prompt, run, session=None):
+        """Queues run(prompt) behind earlier jobs for `session` and returns its Job."""
+        with self._lock:
+            waiting = sum(1 for job in self._active if job.state == QUEUED)
+            if waiting >= self.max_pending:
+                raise QueueFull(f"{waiting} requests are already waiting; try again when one has started.")
+            job = Job(next(self._ids), prompt, session, run)
+            self._active.append(job)
+            queue = self._sessions.setdefault(id(session), collections.deque())
+            queue.append(job)
+            start = len(queue) == 1
+        self._notify(job)
+        if start:
+            self._start(job)
+        return job
+
+    def jobs(self):
+        """Unfinished jobs in submission order, after the most recently finished ones."""
+        with self._lock:
+            return list(self._finished) + list(self._active)
+
+    def cancel(self, job, reason="stopped"):
+        """Cancels a queued job, or interrupts a running one and frees its worker."""
+        with self._lock:
+            if job.state not in (QUEUED, RUNNING):
+                return
+            job.state = CANCELLED
+            job.finished = time.monotonic()
+        job.cancel(reason)
+        job._settled.set()
+        self._notify(job)
+
+    def cancel_all(self, reason="stopped"):
+        for job in self.jobs():
+            self.cancel(job, reason)
+
+    def shutdown(self):
+        self.cancel_all("shut down")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start(self, job):
+        self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        self._chat_slots.acquire()
+        with self._lock:
+            start = job.state == QUEUED
+            if start:
+                job.state = RUNNING
+                job.started = time.monotonic()
+        if not start:  # cancelled while it waited
+            self._chat_slots.release()
+            self._release(job)
+            return
+        self._notify(job)
+        threading.Thread(target=self._chat, args=(job,), name=f"chat-{job.id}", daemon=True).start()
+        job._settled.wait()
+
+    def _chat(self, job):
+        _current_job.set(job)
+        deadline = None
+        if self.request_timeout:
+            deadline = threading.Timer(self.request_timeout, self.cancel,
+                                       (job, f"timed out after {self.request_timeout}s"))
+            deadline.daemon = True
+            deadline.start()
+        try:
+            result = job.run(job.prompt)
+            with self._lock:
+                if job.state == RUNNING:
+                    job.result = result
+                    job.state = DONE
+        except Exception as e:
+            with self._lock:
+                if job.state == RUNNING:
+                    job.error = e
+                    job.state = FAILED
+            logger.debug(f"Job #{job.id} ended: {e}")
+        finally:
+            if deadline is not None:
+                deadline.cancel()
+            _current_job.set(None)
+            with self._lock:
+                if job.finished is None:
+                    job.finished = time.monotonic()
+            job._settled.set()
+            self._chat_slots.release()
+            self._release(job)
+
+    def _release(self, job):
+        """Moves `job` to the finished list and starts the next job of its session."""
+        with self._lock:
+            self._active.remove(job)
+            self._finished.append(job)
+            queue = self._sessions[id(job.session)]
+            queue.popleft()
+            following = queue[0] if queue else None
+            if following is None:
+                del self._sessions[id(job.session)]
+        self._notify(job)
+        if following is not None:
+            self._start(following)
+
+    def _notify(self, job):
+        if self.on_change is not None:
+            try:
+                self.on_change(job)
+            except Exception as e:
+                logger.error(f"Job listener failed: {e}")
+
+
+def show_jobs(job_queue, listbox):
+    """Keeps `listbox` showing job_queue.jobs(), refreshed on the Tk main loop."""
+
+    def refresh():
+        jobs = job_queue.jobs()
+        listbox.delete(0, tk.END)
+        for job in jobs:
+            listbox.insert(tk.END, job.describe())
+        if jobs:
+            listbox.see(tk.END)
+
+    def changed(job):
+        try:
+            listbox.after(0, refresh)
+        except (tk.TclError, RuntimeError):
+            pass  # window closed
+
+    job_queue.on_change = changed
+    refresh()
@@ -0,0 +1,169 @@
+import importlib.machinery
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+def create_parse_pool(max_workers=None):
+    """Process pool for CPU-bound parsing (PdfReader, Document)."""
+    return ParsePool(max_workers)
+
+
+class ParsePool:
+    """Spawn-based process pool that replaces itself when a worker dies.
+
+    Workers are spawned rather than forked, as a fork would copy the app's
+    other threads (Tk, chat engine, indexer) in whatever state they are in.
+    A parser that crashes its worker fails that document, and the next
+    submission starts a fresh pool instead of failing every later document
+    with BrokenProcessPool.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count()
+        self._lock = threading.Lock()
+        _skip_main_in_workers()
+        self._executor = self._create()
+
+    def _create(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, fn, *args, **kwargs):
+        executor = self._executor
+        try:
+            return executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    logger.warning("A parse worker died; starting a new process pool")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._create()
+                return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def _skip_main_in_workers():
+    # Spawned workers re-run the app's script unless __main__ has a spec named
+    # "__main__" (as under `python -m package`). The GUI scripts build their
+    # windows at import time, and the parsers only need autogengui.
+    main = sys.modules["__main__"]
+    if getattr(main, "__spec__", None) is None:
+        main.__spec__ = importlib.machinery.ModuleSpec("__main__", None)
+
+
+class LoadResult:
+    def __init__(self, path, text=None, error=None):
+        self.path = path
+        self.text = text
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class DocumentLoader:
+    """Reads many documents concurrently, returning results in input order.
+
+    Network fetches run on up to `max_workers` threads; parsing is offloaded
+    to the document handler's parse executor when it has one. A document
+    that fails or takes longer than `timeout` seconds from when it started
+    is reported in its LoadResult instead of aborting the rest of the batch,
+    and its thread is abandoned so the documents behind it still start.
+    """
+
+    def __init__(self, document_handler, max_workers=8, timeout=120):
+        self.document_handler = document_handler
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def load(self, paths, progress=None):
+        """Loads `paths`; `progress(done, total)` is called as documents finish."""
+        paths = list(paths)
+        if not paths:
+            return []
+
+        results = [None] * len(paths)
+        running = {}  # future -> (index, deadline)
+        queued = iter(enumerate(paths))
+        done_count = 0
+        while True:
+            while len(running) < self.max_workers:
+                index, path = next(queued, (None, None))
+                if index is None:
+                    break
+                running[self._start(path)] = (index, time.monotonic() + self.timeout)
+            if not running:
+                break
+
+            next_deadline = min(deadline for _, deadline in running.values())
+            done, _ = wait(running, timeout=max(0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future, (index, deadline) in list(running.items()):
+                if future in done:
+                    try:
+                        results[index] = LoadResult(paths[index], text=future.result())
+                    except Exception as e:
+                        results[index] = LoadResult(paths[index], error=str(e) or type(e).__name__)
+                elif now >= deadline:
+                    results[index] = LoadResult(paths[index], error=f"timed out after {self.timeout}s")
+                else:
+                    continue
+                del running[future]
+                done_count += 1
+                if progress is not None:
+                    progress(done_count, len(paths))
+
+        failed = [result for result in results if not result.ok]
+        if failed:
+            logger.warning(f"{len(failed)} of {len(paths)} documents could not be loaded")
+        return results
+
+    def _start(self, path):
+        # A thread per document rather than a pool: a read that times out keeps
+        # its thread, and must not hold up the documents queued behind it.
+        future = Future()
+
+        def read():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(self.document_handler.read_document(path))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=read, name="document-loader", daemon=True).start()
+        return future
+
+    def load_texts(self, paths, dedup=True):
+        """Returns (texts, failures) where failures is a list of (path, error).
+
+        With `dedup`, a document that is a near-duplicate of an earlier one in
+        `paths` is left out and reported in failures, so whole-document prompts
+        do not carry the same text twice.
+        """
+        results = self.load(paths)
+        deduplicator = None
+        if dedup:
+            from autogengui.dedup import MinHashDeduplicator
+
+            deduplicator = MinHashDeduplicator()
+        texts, failures = [], []
+        for result in results:
+            if not result.ok:
+                failures.append((result.path, result.error))
+                continue
+            original = deduplicator.add(result.path, result.text) if deduplicator is not None else None
+            if original is None:
+                texts.append(result.text)
+            else:
+                failures.append((result.path, f"near-duplicate of {original}"))
+        return texts, failures
@@ -0,0 +1,69 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+from autogengui.tools import nested_chat_position
+
+logger = logging.getLogger(__name__)
+
+
+def register_parallel_nested_chats(agent, chats, trigger, position=None, max_workers=None):
+    """Like agent.register_nested_chats, but chats that do not depend on each other run at once.
+
+    Each chat is an autogen chat_queue entry with a unique "name" and, optionally,
+    "depends_on": the names of earlier chats whose summaries it needs. A chat
+    starts as soon as those have finished and gets their summaries as
+    carryover, so the nested reply takes as long as its longest chain of
+    dependent chats rather than the sum of all of them. The reply is the
+    summary of the last chat in `chats`. `position` defaults to the slot
+    after the agent's tool call replies, see nested_chat_position.
+    """
+    names = set()
+    for chat in chats:
+        missing = [name for name in chat.get("depends_on", ()) if name not in names]
+        if missing:
+            raise ValueError(f"Nested chat {chat['name']!r} depends on {missing}, which must come before it")
+        if chat["name"] in names:
+            raise ValueError(f"Duplicate nested chat name {chat['name']!r}")
+        names.add(chat["name"])
+    if position is None:
+        position = nested_chat_position(agent)
+    agent.register_reply(trigger, partial(_reply_from_chat_graph, chats, max_workers), position)
+
+
+def _reply_from_chat_graph(chats, max_workers, recipient, messages=None, sender=None, config=None):
+    started = time.perf_counter()
+    summaries = {}
+    pending = list(chats)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(chats), thread_name_prefix="nested") as pool:
+        while pending or running:
+            for chat in [chat for chat in pending if all(name in summaries for name in chat.get("depends_on", ()))]:
+                pending.remove(chat)
+                carryover = [summaries[name] for name in chat.get("depends_on", ()) if summaries[name]]
+                # A copy of this thread's context keeps the job's cancellation and output state.
+                future = pool.submit(contextvars.copy_context().run, _run_chat, chat, carryover, recipient,
+                                     messages, sender, config)
+                running[future] = chat["name"]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                summaries[running.pop(future)] = future.result()
+    logger.info(f"{len(chats)} nested chats took {time.perf_counter() - started:.2f}s")
+    return True, summaries[chats[-1]["name"]]
+
+
+def _run_chat(chat, carryover, recipient, messages, sender, config):
+    chat = {k: v for k, v in chat.items() if k not in ("name", "depends_on")}
+    message = chat.pop("message", None)
+    if callable(message):
+        message = message(recipient, messages, sender, config)
+    elif message is None:
+        message = messages[-1].get("content")
+    if not message:
+        return None
+    chat_sender = chat.pop("sender", None) or recipient
+    if carryover:
+        chat["carryover"] = carryover
+    return chat_sender.initiate_chat(chat.pop("recipient"), message=message, **chat).summary
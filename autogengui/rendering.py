@@ -0,0 +1,94 @@
+import json
+
+import autogen
+from autogen.code_utils import content_str
+
+# Readable on the apps' black backgrounds; agents beyond these reuse them in order.
+AGENT_COLOURS = ("#4fc3f7", "#ffb74d", "#ce93d8", "#e57373", "#81c784", "#fff176")
+SEPARATOR = "-" * 80
+
+
+class MessageRenderer:
+    """Writes group chat messages to a TextRedirector, each agent in its own colour.
+
+    add_agents() creates the Text widget tags, so call it from the Tk main loop
+    (where the agents are created); render() may be called from any thread.
+    With `streaming_output`, a message whose text was just streamed to the
+    pane is closed with a separator instead of being written out again.
+    """
+
+    def __init__(self, redirector, colours=AGENT_COLOURS, streaming_output=None):
+        self.redirector = redirector
+        self.colours = colours
+        self.streaming_output = streaming_output
+        self._tags = {}
+
+    def add_agents(self, *agents):
+        for agent in agents:
+            if agent.name not in self._tags:
+                tag = f"agent{len(self._tags)}"
+                colour = self.colours[len(self._tags) % len(self.colours)]
+                self.redirector.text_widget.tag_configure(tag, foreground=colour)
+                self._tags[agent.name] = tag
+
+    def render(self, message, sender):
+        tag = self._tags.get(sender.name)
+        if self._was_streamed(message, sender):
+            self.redirector.write_tagged(f"{SEPARATOR}\n", tag)
+            return
+        self.redirector.write_tagged(f"\n{sender.name}:\n", tag)
+        self.redirector.write_tagged(format_message(message) + f"\n{SEPARATOR}\n", tag)
+
+    def _was_streamed(self, message, sender):
+        if self.streaming_output is None:
+            return False
+        streamed = self.streaming_output.take_streamed(sender.name)
+        if streamed is None or message.get("tool_calls") or message.get("function_call"):
+            return False
+        return streamed.strip() == content_str(message.get("content")).strip()
+
+
+def format_message(message):
+    """Plain-text body of an autogen message dict, including any tool or function calls."""
+    lines = []
+    if message.get("content") is not None:
+        lines.append(content_str(message["content"]))
+    calls = [call["function"] for call in message.get("tool_calls") or []]
+    if message.get("function_call"):
+        calls.append(message["function_call"])
+    for call in calls:
+        arguments = call.get("arguments", "")
+        try:
+            arguments = json.dumps(json.loads(arguments), ensure_ascii=False)
+        except (TypeError, ValueError):
+            pass
+        lines.append(f"[calls {call.get('name')}({arguments})]")
+    return "\n".join(lines)
+
+
+class RenderingGroupChatManager(autogen.GroupChatManager):
+    """GroupChatManager that renders each message as the speaker sends it.
+
+    Every message in the group chat is sent to the manager once, so rendering
+    it with `renderer` as the manager receives it shows the conversation as it
+    happens, without walking groupchat.messages afterwards. The message is then
+    received silently, in place of autogen's own console echo.
+    """
+
+    def __init__(self, groupchat, renderer, **kwargs):
+        super().__init__(groupchat=groupchat, **kwargs)
+        self.renderer = renderer
+
+    def receive(self, message, sender, request_reply=None, silent=False):
+        if not silent:
+            self.renderer.render(_as_dict(message), sender)
+        super().receive(message, sender, request_reply, silent=True)
+
+    async def a_receive(self, message, sender, request_reply=None, silent=False):
+        if not silent:
+            self.renderer.render(_as_dict(message), sender)
+        await super().a_receive(message, sender, request_reply, silent=True)
+
+
+def _as_dict(message):
+    return dict(message) if isinstance(message, dict) else {"content": message}
@@ -0,0 +1,395 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+from autogengui.cache import DEFAULT_CACHE_DIR
+from autogengui.documents import split_page_spec
+from autogengui.tokens import count_tokens
+
+DEFAULT_CHUNK_SIZE = 200  # words
+DEFAULT_CHUNK_OVERLAP = 40
+DEFAULT_TOP_K = 5
+RETRIEVAL_MODES = ("bm25", "vector")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def default_vector_path(app_name):
+    """Per-app location of the persisted vector matrix, so two apps never share one."""
+    return os.path.join(DEFAULT_CACHE_DIR, "vectors", f"{app_name}.f32")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class Chunk:
+    def __init__(self, source, index, text):
+        self.source = source
+        self.index = index
+        self.text = text
+
+    def __repr__(self):
+        return f"Chunk({self.source!r}, {self.index})"
+
+
+def iter_chunks(pieces, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+    """Yields word-window chunks from an iterable of text pieces (e.g. PDF pages).
+
+    Only the current window is kept in memory, so pieces can come straight
+    from a page generator.
+    """
+    if isinstance(pieces, str):
+        pieces = [pieces]
+    overlap = min(overlap, chunk_size - 1) if chunk_size > 1 else 0
+    window = []
+    emitted = False
+    for piece in pieces:
+        window.extend(piece.split())
+        while len(window) >= chunk_size:
+            yield ' '.join(window[:chunk_size])
+            emitted = True
+            window = window[chunk_size - overlap:]
+    # Skip a tail that is nothing but the overlap we already emitted.
+    if window and (not emitted or len(window) > overlap):
+        yield ' '.join(window)
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over chunks."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = {}
+        self.postings = defaultdict(dict)  # term -> {chunk_id: term frequency}
+        self.lengths = {}
+        self.total_length = 0
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add(self, chunk, terms=None):
+        chunk_id = self._next_id
+        self._next_id += 1
+        if terms is None:
+            terms = Counter(tokenize(chunk.text))
+        for term, frequency in terms.items():
+            self.postings[term][chunk_id] = frequency
+        self.chunks[chunk_id] = chunk
+        self.lengths[chunk_id] = sum(terms.values())
+        self.total_length += self.lengths[chunk_id]
+        return chunk_id
+
+    def add_many(self, chunks, terms=None):
+        if terms is None:
+            terms = [None] * len(chunks)
+        return [self.add(chunk, chunk_terms) for chunk, chunk_terms in zip(chunks, terms)]
+
+    def remove(self, chunk_id):
+        chunk = self.chunks.pop(chunk_id)
+        for term in set(tokenize(chunk.text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(chunk_id)
+
+    def search(self, query, k=DEFAULT_TOP_K):
+        if not self.chunks:
+            return []
+        count = len(self.chunks)
+        average_length = self.total_length / count or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average_length)
+                scores[chunk_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self.chunks[chunk_id]) for chunk_id, score in best]
+
+
+def source_fingerprint(source):
+    """Cheap change marker for a local file; None when only the server can tell (URLs)."""
+    base, _ = split_page_spec(source)
+    if _is_url(base):
+        return None
+    try:
+        stat = os.stat(base)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def url_fingerprint(etag, last_modified):
+    """Change marker for a URL from its response validators; None when it sent neither."""
+    if not etag and not last_modified:
+        return None
+    return f"{etag or ''}|{last_modified or ''}"
+
+
+def _is_url(source):
+    return source.startswith('http://') or source.startswith('https://')
+
+
+class DocumentIndex:
+    """Chunks documents into a search backend, re-indexing only documents that changed.
+
+    mode is "bm25" for lexical ranking or "vector" for the NumPy hashed n-gram
+    index, which is persisted to `vector_path` when one is given. With a
+    CorpusStore, chunks and postings survive restarts and a source whose
+    fingerprint is unchanged is restored from the store without being read.
+    A URL counts as unchanged when the server answers a conditional request
+    with the ETag/Last-Modified it was indexed from with 304 Not Modified.
+
+    With `dedup`, a chunk that is a near-duplicate of one already indexed
+    (MinHash over word shingles) is left out of the backend, so repeated
+    boilerplate and copied passages never compete for the prompt. The store
+    keeps every chunk; dropping happens each time a document is indexed.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP, mode="bm25",
+                 vector_path=None, store=None, dedup=True):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.mode = mode
+        self.vector_path = vector_path
+        self.store = store
+        self.dedup = dedup
+        self._lock = threading.Lock()
+        self._reset()
+
+    def configure(self, chunk_size=None, overlap=None, mode=None):
+        chunk_size = chunk_size or self.chunk_size
+        overlap = self.overlap if overlap is None else overlap
+        mode = mode or self.mode
+        if (chunk_size, overlap, mode) != (self.chunk_size, self.overlap, self.mode):
+            with self._lock:
+                self.chunk_size = chunk_size
+                self.overlap = overlap
+                self.mode = mode
+                self._reset()
+
+    def update(self, sources, loader, progress=None):
+        """Brings the index in line with `sources`, reading only stale ones through `loader`.
+
+        `progress(done, total)` counts unchanged sources as already done.
+        Returns the LoadResults of the documents that could not be read.
+        """
+        fetcher = getattr(loader.document_handler, "fetcher", None)
+        fingerprints = {source: source_fingerprint(source) or self._revalidate(source, fetcher)
+                        for source in sources}
+        with self._lock:
+            for source in list(self._documents):
+                if source not in fingerprints:
+                    self._remove(source)
+                    if self.store is not None:
+                        self.store.remove_source(source)
+            stale = [source for source, fingerprint in fingerprints.items() if not self._restore(source, fingerprint)]
+
+        fresh = len(fingerprints) - len(stale)
+        if progress is not None:
+            progress(fresh, len(fingerprints))
+            results = loader.load(stale, progress=lambda done, _: progress(fresh + done, len(fingerprints)))
+        else:
+            results = loader.load(stale)
+        self._read_validators(results, fingerprints, fetcher)
+        with self._lock:
+            for result in results:
+                if result.ok:
+                    self._index(result.path, result.text, fingerprints[result.path])
+            orphans = self._take_orphans(fingerprints)
+
+        # Documents whose duplicates pointed at a removed or changed document
+        # lost that text; index them again now that the original is gone.
+        if orphans:
+            orphan_results = loader.load(orphans)
+            self._read_validators(orphan_results, fingerprints, fetcher)
+            with self._lock:
+                for result in orphan_results:
+                    if result.ok:
+                        self._index(result.path, result.text, fingerprints[result.path])
+            results += orphan_results
+
+        with self._lock:
+            # Removals zero their vector rows at once, so the metadata has to
+            # follow whenever anything changed, not only when a source was read.
+            if self._changed and hasattr(self.backend, "save"):
+                self.backend.save(self._documents, [self.chunk_size, self.overlap])
+            self._changed = False
+        return [result for result in results if not result.ok]
+
+    def search(self, query, k=DEFAULT_TOP_K):
+        with self._lock:
+            return self.backend.search(query, k)
+
+    def dedup_summary(self):
+        """Near-duplicate chunks kept out of the index and their token count, e.g. for the status bar."""
+        with self._lock:
+            dropped = [tokens for duplicates in self._dropped.values() for _, tokens in duplicates]
+        if not dropped:
+            return ""
+        return f"{len(dropped)} near-duplicate chunks skipped (~{sum(dropped)} tokens saved)"
+
+    def _reset(self):
+        self._documents = {}  # source -> (text digest, [chunk ids])
+        self._fingerprints = {}
+        self._dropped = {}  # source -> [(source of the kept original, tokens)]
+        self._orphans = set()
+        self._changed = False  # backend differs from what it last saved
+        self.deduplicator = None
+        if self.dedup:
+            from autogengui.dedup import MinHashDeduplicator
+
+            self.deduplicator = MinHashDeduplicator()
+        if self.mode == "bm25":
+            self.backend = BM25Index()
+            return
+        if self.mode != "vector":
+            raise ValueError(f"Unknown retrieval mode: {self.mode}")
+
+        from autogengui.vectors import VectorIndex  # NumPy is only needed for this mode
+
+        self.backend = VectorIndex(self.vector_path)
+        if self.backend.settings == [self.chunk_size, self.overlap]:
+            self._documents = dict(self.backend.documents)
+            if self.deduplicator is not None:
+                for chunk in self.backend.chunks.values():
+                    self.deduplicator.add((chunk.source, chunk.index), chunk.text)
+        else:
+            for chunk_id in list(self.backend.chunks):
+                self.backend.remove(chunk_id)
+            self._changed = True
+
+    def _revalidate(self, source, fetcher):
+        """The stored fingerprint of a URL the server confirms is unchanged, else None."""
+        base, _ = split_page_spec(source)
+        if self.store is None or fetcher is None or not _is_url(base):
+            return None
+        row = self.store.get_source(source)
+        if row is None or row["fingerprint"] is None:
+            return None
+        if not fetcher.revalidate(base, row["etag"], row["last_modified"]):
+            return None
+        return row["fingerprint"]
+
+    @staticmethod
+    def _read_validators(results, fingerprints, fetcher):
+        # A freshly read URL is fingerprinted by the validators its body was cached with.
+        if fetcher is None:
+            return
+        for result in results:
+            base, _ = split_page_spec(result.path)
+            if result.ok and _is_url(base):
+                fingerprints[result.path] = url_fingerprint(*fetcher.validators(base))
+
+    def _restore(self, source, fingerprint):
+        """True if `source` is indexed and unchanged, restoring it from the store if needed."""
+        if fingerprint is None:
+            return False
+        if source in self._documents and self._fingerprints.get(source) == fingerprint:
+            return True
+        if self.store is None:
+            return False
+        row = self.store.get_source(source)
+        if row is None or row["fingerprint"] != fingerprint or (row["chunk_size"], row["overlap"]) != (self.chunk_size, self.overlap):
+            return False
+
+        current = self._documents.get(source)
+        if current is None or current[0] != row["digest"]:
+            if current is not None:
+                self._remove(source)
+            stored = self.store.load_chunks(source)
+            chunks = [Chunk(source, index, text) for index, (text, _) in enumerate(stored)]
+            self._add(source, row["digest"], chunks, [terms for _, terms in stored])
+        self._fingerprints[source] = fingerprint
+        return True
+
+    def _index(self, source, text, fingerprint):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self._fingerprints[source] = fingerprint
+        current = self._documents.get(source)
+        if current is not None and current[0] == digest:
+            if self.store is not None:
+                self.store.set_fingerprint(source, fingerprint, *self._validators(source, fingerprint))
+            return
+        if current is not None:
+            self._remove(source)
+
+        chunks = [
+            Chunk(source, index, chunk_text)
+            for index, chunk_text in enumerate(iter_chunks(text, self.chunk_size, self.overlap))
+        ]
+        terms = [Counter(tokenize(chunk.text)) for chunk in chunks]
+        self._add(source, digest, chunks, terms)
+        if self.store is not None:
+            etag, last_modified = self._validators(source, fingerprint)
+            self.store.save_document(source, fingerprint, digest, self.chunk_size, self.overlap,
+                                     [(chunk.text, chunk_terms) for chunk, chunk_terms in zip(chunks, terms)],
+                                     etag=etag, last_modified=last_modified)
+
+    @staticmethod
+    def _validators(source, fingerprint):
+        """(ETag, Last-Modified) back out of a URL's fingerprint, for the store's columns."""
+        if fingerprint is None or not _is_url(split_page_spec(source)[0]):
+            return None, None
+        etag, _, last_modified = fingerprint.rpartition('|')
+        return etag or None, last_modified or None
+
+    def _add(self, source, digest, chunks, terms):
+        """Adds a document's chunks to the backend, leaving out near-duplicates of indexed chunks."""
+        kept, kept_terms, dropped = [], [], []
+        for chunk, chunk_terms in zip(chunks, terms):
+            original = None
+            if self.deduplicator is not None:
+                original = self.deduplicator.add((source, chunk.index), chunk.text)
+            if original is None:
+                kept.append(chunk)
+                kept_terms.append(chunk_terms)
+            else:
+                dropped.append((original[0], count_tokens(chunk.text)))
+        self._documents[source] = (digest, self.backend.add_many(kept, kept_terms))
+        self._dropped[source] = dropped
+        self._changed = True
+
+    def _remove(self, source):
+        _, chunk_ids = self._documents.pop(source)
+        self._changed = True
+        self._fingerprints.pop(source, None)
+        self._dropped.pop(source, None)
+        for chunk_id in chunk_ids:
+            chunk = self.backend.chunks[chunk_id]
+            if self.deduplicator is not None:
+                self.deduplicator.remove((chunk.source, chunk.index))
+            self.backend.remove(chunk_id)
+
+        # Chunks of other documents that were dropped as copies of this one
+        # have no original left in the index.
+        dependents = [other for other, duplicates in self._dropped.items()
+                      if any(original == source for original, _ in duplicates)]
+        for other in dependents:
+            self._remove(other)
+            self._orphans.add(other)
+
+    def _take_orphans(self, fingerprints):
+        """Restores orphaned documents from the store, returning those that must be read again."""
+        orphans = [source for source in self._orphans if source in fingerprints and source not in self._documents]
+        self._orphans.clear()
+        return [source for source in orphans if not self._restore(source, fingerprints[source])]
+
+
+def format_chunk(chunk):
+    return f"[{chunk.source} #{chunk.index + 1}]\n{chunk.text}"
+
+
+def format_chunks(results):
+    return "\n\n".join(format_chunk(chunk) for _, chunk in results)
@@ -0,0 +1,140 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from autogengui.cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    fingerprint TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    digest TEXT,
+    chunk_size INTEGER,
+    overlap INTEGER,
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    source TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (source, position)
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    source TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    frequency INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS postings_by_source ON postings (source, position);
+CREATE TABLE IF NOT EXISTS corpus (
+    position INTEGER PRIMARY KEY,
+    source TEXT NOT NULL
+);
+"""
+
+
+def default_store_path(app_name):
+    return os.path.join(DEFAULT_CACHE_DIR, "corpus", f"{app_name}.sqlite3")
+
+
+class CorpusStore:
+    """SQLite-backed corpus: the app's document list plus chunks and BM25 postings.
+
+    Each source row keeps the fingerprint it was indexed from (size/mtime for
+    files, ETag/Last-Modified for URLs), so the next session can reuse the
+    stored chunks instead of extracting the document again.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get_source(self, source):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fingerprint, etag, last_modified, digest, chunk_size, overlap FROM sources WHERE source = ?",
+                (source,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("fingerprint", "etag", "last_modified", "digest", "chunk_size", "overlap")
+        return dict(zip(keys, row))
+
+    def save_document(self, source, fingerprint, digest, chunk_size, overlap, chunks, etag=None, last_modified=None):
+        """Replaces a source's chunks and postings. `chunks` is a list of (text, term counts)."""
+        with self._lock, self._connection:
+            self._delete_source(source)
+            self._connection.execute(
+                "INSERT INTO sources (source, fingerprint, etag, last_modified, digest, chunk_size, overlap, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, fingerprint, etag, last_modified, digest, chunk_size, overlap, time.time()),
+            )
+            self._connection.executemany(
+                "INSERT INTO chunks (source, position, text) VALUES (?, ?, ?)",
+                ((source, position, text) for position, (text, _) in enumerate(chunks)),
+            )
+            self._connection.executemany(
+                "INSERT INTO postings (term, source, position, frequency) VALUES (?, ?, ?, ?)",
+                (
+                    (term, source, position, frequency)
+                    for position, (_, terms) in enumerate(chunks)
+                    for term, frequency in terms.items()
+                ),
+            )
+
+    def set_fingerprint(self, source, fingerprint, etag=None, last_modified=None):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE sources SET fingerprint = ?, etag = ?, last_modified = ? WHERE source = ?",
+                (fingerprint, etag, last_modified, source),
+            )
+
+    def load_chunks(self, source):
+        """Returns [(text, term counts)] in chunk order, as written by save_document."""
+        with self._lock:
+            texts = self._connection.execute(
+                "SELECT text FROM chunks WHERE source = ? ORDER BY position", (source,)
+            ).fetchall()
+            postings = self._connection.execute(
+                "SELECT position, term, frequency FROM postings WHERE source = ?", (source,)
+            ).fetchall()
+        chunks = [(text, {}) for (text,) in texts]
+        for position, term, frequency in postings:
+            chunks[position][1][term] = frequency
+        return chunks
+
+    def remove_source(self, source):
+        with self._lock, self._connection:
+            self._delete_source(source)
+
+    def load_corpus(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT source FROM corpus ORDER BY position").fetchall()
+        return [source for (source,) in rows]
+
+    def save_corpus(self, sources):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM corpus")
+            self._connection.executemany(
+                "INSERT INTO corpus (position, source) VALUES (?, ?)", enumerate(sources)
+            )
+
+    def _delete_source(self, source):
+        self._connection.execute("DELETE FROM postings WHERE source = ?", (source,))
+        self._connection.execute("DELETE FROM chunks WHERE source = ?", (source,))
+        self._connection.execute("DELETE FROM sources WHERE source = ?", (source,))
@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+import logging
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from autogen.io import IOConsole, IOStream
+
+from autogengui.jobs import check_cancelled
+
+logger = logging.getLogger(__name__)
+
+# autogen's OpenAI client brackets every streamed completion with these.
+STREAM_START = "\033[32m"
+STREAM_END = "\033[0m"
+ANSI_ESCAPE = re.compile(r"\033\[[0-9;]*m")
+
+_quiet = contextvars.ContextVar("quiet_streams", default=False)
+
+
+def enable_streaming(llm_config):
+    """A copy of `llm_config` that asks the endpoint to stream completions token by token."""
+    return {**llm_config, "stream": True}
+
+
+@contextmanager
+def quiet_streams():
+    """Within the block, completions streamed by this thread or task are not echoed token by token."""
+    token = _quiet.set(True)
+    try:
+        yield
+    finally:
+        _quiet.reset(token)
+
+
+def _owner():
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:  # no event loop in this thread
+        task = None
+    return task or threading.get_ident()
+
+
+class StreamingOutput(IOConsole):
+    """autogen IOStream that labels streamed completions with the agent producing them.
+
+    Tokens arrive through print() while the completion is still being generated
+    and go straight to sys.stdout (the app's TextRedirector). Agents passed to
+    watch() announce themselves before each reply so the stream gets a header
+    with their name; the terminal colour codes autogen emits are stripped.
+    Every token checks for cancellation, so stopping a job abandons the
+    response it is streaming. Stream state is kept per thread and per asyncio
+    task, so chats sharing an event loop get their own headers. Streams inside
+    quiet_streams() are consumed without being echoed. The text last echoed
+    for each agent is kept for take_streamed().
+    """
+
+    def __init__(self):
+        self._context = contextvars.ContextVar("stream_state")
+        self._lock = threading.Lock()
+        self._streamed = {}  # agent name -> text of its last echoed stream
+        self.first_token_seconds = None  # time to first token of the most recent stream
+
+    def watch(self, *agents):
+        for agent in agents:
+            agent.register_hook("process_all_messages_before_reply", self._speaker_hook(agent.name))
+
+    def take_streamed(self, name):
+        """The text last streamed by agent `name`, or None; each stream is returned once."""
+        with self._lock:
+            return self._streamed.pop(name, None)
+
+    def print(self, *objects, sep=" ", end="\n", flush=False):
+        text = sep.join(str(obj) for obj in objects) + end
+        state = self._state()
+        if state.streaming:
+            try:
+                check_cancelled()
+            except Exception:
+                state.streaming = False
+                state.speaker = None
+                state.streamed = None
+                sys.stdout.write("\n")
+                raise
+        if text.startswith(STREAM_START):
+            state.streaming = True
+            state.waiting = True
+            state.quiet = _quiet.get()
+            if state.quiet:
+                return
+            state.streamed = [] if state.speaker else None
+            sys.stdout.write(f"\n{state.speaker or 'model'} (streaming):\n")
+        elif STREAM_END in text and state.streaming:
+            state.streaming = False
+            if state.quiet:
+                state.speaker = None
+                return
+            if state.streamed is not None:
+                with self._lock:
+                    self._streamed[state.speaker] = "".join(state.streamed)
+            state.speaker = None
+            state.streamed = None
+        elif state.streaming and state.quiet:
+            return
+        elif state.waiting and text.strip():
+            state.waiting = False
+            if state.reply_started is not None:
+                self.first_token_seconds = time.monotonic() - state.reply_started
+                logger.debug(f"First streamed token after {self.first_token_seconds:.3f}s")
+        text = ANSI_ESCAPE.sub("", text)
+        if state.streaming and state.streamed is not None:
+            state.streamed.append(text)
+        if text:
+            sys.stdout.write(text)
+
+    def _state(self):
+        state = self._context.get(None)
+        owner = _owner()
+        # Threads and tasks started with a copy of the context (to_thread, nested chats, gather) get their own.
+        if state is None or state.owner != owner:
+            state = SimpleNamespace(owner=owner, speaker=None, reply_started=None, streaming=False, waiting=False,
+                                    quiet=False, streamed=None)
+            self._context.set(state)
+        return state
+
+    def _speaker_hook(self, name):
+        def announce(messages):
+            state = self._state()
+            state.speaker = name
+            state.reply_started = time.monotonic()
+            return messages
+
+        return announce
+
+
+def install_streaming_output():
+    """Makes a StreamingOutput the default autogen IOStream for every thread and returns it."""
+    output = StreamingOutput()
+    IOStream.set_global_default(output)
+    return output
@@ -0,0 +1,128 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from autogengui.cache import DEFAULT_CACHE_DIR, DocumentCache
+from autogengui.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SECTION_TOKENS = 1500
+DEFAULT_SUMMARY_WORKERS = 4
+DEFAULT_SUMMARY_ROUNDS = 3
+SUMMARY_PROMPT = (
+    "Summarize the following section of a longer document. Keep the facts, names, numbers, "
+    "commands and code that someone answering questions about the document would need. "
+    "Reply with the summary only."
+)
+
+
+def split_sections(text, section_tokens=DEFAULT_SECTION_TOKENS, model="gpt-4"):
+    """Splits text into sections of about `section_tokens`, breaking between paragraphs where possible."""
+    sections = []
+    current, current_tokens = [], 0
+    for paragraph in text.split('\n\n'):
+        tokens = count_tokens(paragraph, model)
+        if tokens > section_tokens:
+            # A single oversized paragraph is cut by words.
+            words = paragraph.split()
+            step = max(1, len(words) * section_tokens // tokens)
+            pieces = [' '.join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            pieces = [paragraph]
+        for piece in pieces:
+            piece_tokens = tokens if len(pieces) == 1 else count_tokens(piece, model)
+            if current and current_tokens + piece_tokens > section_tokens:
+                sections.append('\n\n'.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        sections.append('\n\n'.join(current))
+    return sections
+
+
+class DocumentSummarizer:
+    """Map-reduce summaries of documents too large for the context budget.
+
+    An oversized document is split into sections which are summarized
+    concurrently (at most `max_workers` requests in flight) against the first
+    endpoint in `config_list`; the joined summaries are summarized again until
+    they fit, for at most `max_rounds` rounds. Section summaries are cached by
+    a hash of the model, prompt and section text, so unchanged documents cost
+    nothing on the next request. `config_list` is read on every call, so a
+    base URL changed in the GUI takes effect immediately.
+    """
+
+    def __init__(self, config_list, section_tokens=DEFAULT_SECTION_TOKENS, max_workers=DEFAULT_SUMMARY_WORKERS,
+                 max_rounds=DEFAULT_SUMMARY_ROUNDS, cache=None, prompt=SUMMARY_PROMPT):
+        self.config_list = config_list
+        self.section_tokens = section_tokens
+        self.max_rounds = max_rounds
+        self.prompt = prompt
+        self.cache = cache if cache is not None else DocumentCache(os.path.join(DEFAULT_CACHE_DIR, "summaries"))
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summarizer")
+
+    @property
+    def model(self):
+        return self.config_list[0]["model"]
+
+    def summarize(self, text, max_tokens, progress=None):
+        return self.summarize_many([text], max_tokens, progress)[0]
+
+    def summarize_many(self, texts, max_tokens, progress=None):
+        """Returns `texts` with every one longer than `max_tokens` replaced by its summary.
+
+        Sections of all documents share the worker pool. `progress(done, total)`
+        reports finished sections of the current round.
+        """
+        import autogen  # only the apps that summarize need a client
+
+        client = autogen.OpenAIWrapper(config_list=[dict(self.config_list[0])], cache_seed=None)
+        texts = list(texts)
+        pending = [index for index, text in enumerate(texts) if count_tokens(text, self.model) > max_tokens]
+        for _ in range(self.max_rounds):
+            if not pending:
+                break
+            sections = {index: split_sections(texts[index], self.section_tokens, self.model) for index in pending}
+            total = sum(len(parts) for parts in sections.values())
+            done = [0]
+            done_lock = threading.Lock()
+
+            def summarize_section(section):
+                summary = self._summarize_section(client, section)
+                if progress is not None:
+                    with done_lock:
+                        done[0] += 1
+                        count = done[0]
+                    progress(count, total)
+                return summary
+
+            futures = {index: [self._pool.submit(summarize_section, section) for section in parts]
+                       for index, parts in sections.items()}
+            for index, section_futures in futures.items():
+                texts[index] = '\n\n'.join(future.result() for future in section_futures)
+            # A single section that is still too long will not shrink further.
+            pending = [index for index in pending
+                       if len(sections[index]) > 1 and count_tokens(texts[index], self.model) > max_tokens]
+        return texts
+
+    def _summarize_section(self, client, section):
+        key = self.cache.content_key(f"{self.model}\0{self.prompt}\0{section}".encode("utf-8"))
+        summary = self.cache.get(key)
+        if summary is not None:
+            return summary
+        try:
+            response = client.create(messages=[
+                {"role": "system", "content": self.prompt},
+                {"role": "user", "content": section},
+            ], temperature=0)
+            summary = client.extract_text_or_completion_object(response)[0]
+        except Exception as e:
+            logger.warning(f"Could not summarize a document section, sending it as is: {e}")
+            return section
+        if not summary:
+            return section
+        self.cache.put(key, summary)
+        return summary
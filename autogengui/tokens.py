@@ -0,0 +1,79 @@
+import functools
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 8000
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    """tiktoken encoding for `model`, or None when tiktoken (or its BPE files) is unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Local OpenAI-compatible backends report arbitrary model names.
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def count_tokens(text, model="gpt-4"):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class PackResult:
+    def __init__(self, texts, used_tokens, budget, dropped, dropped_tokens):
+        self.texts = texts
+        self.used_tokens = used_tokens
+        self.budget = budget
+        self.dropped = dropped
+        self.dropped_tokens = dropped_tokens
+
+    def summary(self):
+        message = f"Context: {self.used_tokens}/{self.budget} tokens, {len(self.texts)} document parts sent"
+        if self.dropped:
+            message += f", {self.dropped} dropped ({self.dropped_tokens} tokens dropped)"
+        return message
+
+
+class ContextPacker:
+    """Fits candidate context into a token budget, most relevant first.
+
+    Candidates are taken in the order given (best first). One that does not
+    fit is skipped rather than ending the pass, so a smaller, lower-ranked
+    candidate can still use the remaining room.
+    """
+
+    def __init__(self, budget=DEFAULT_TOKEN_BUDGET, model="gpt-4"):
+        self.budget = budget
+        self.model = model
+
+    def available(self, fixed_text):
+        """Tokens left for candidates once `fixed_text` is counted."""
+        return max(self.budget - count_tokens(fixed_text, self.model), 0)
+
+    def pack(self, fixed_text, candidates, separator="\n\n"):
+        used = count_tokens(fixed_text, self.model)
+        separator_tokens = count_tokens(separator, self.model)
+        texts = []
+        dropped = 0
+        dropped_tokens = 0
+        for candidate in candidates:
+            cost = count_tokens(candidate, self.model) + (separator_tokens if texts else 0)
+            if used + cost <= self.budget:
+                texts.append(candidate)
+                used += cost
+            else:
+                dropped += 1
+                dropped_tokens += cost
+        return PackResult(texts, used, self.budget, dropped, dropped_tokens)
@@ -0,0 +1,84 @@
+from typing_extensions import Annotated
+
+from autogengui.retrieval import DEFAULT_TOP_K, format_chunk
+
+MAX_SEARCH_RESULTS = 20
+SEARCH_TOOL_NAME = "search_documents"
+SEARCH_TOOL_DESCRIPTION = (
+    "Search the user's documents and return the passages most relevant to the query, "
+    "each labelled with its source. Call it again with a different query if the passages "
+    "do not answer the question."
+)
+SEARCH_TOOL_HINT = (
+    f"The user's documents are not included here. Call the {SEARCH_TOOL_NAME} tool to look up "
+    "the passages you need."
+)
+
+
+def make_search_tool(document_index, packer=None):
+    """search_documents(query, k) over `document_index`, trimmed to `packer`'s budget when given."""
+
+    def search_documents(
+        query: Annotated[str, "Keywords or a question describing the information needed"],
+        k: Annotated[int, "Number of passages to return"] = DEFAULT_TOP_K,
+    ) -> str:
+        k = max(1, min(int(k), MAX_SEARCH_RESULTS))
+        candidates = [format_chunk(chunk) for _, chunk in document_index.search(query, k)]
+        if not candidates:
+            return "No matching passages were found in the documents."
+        if packer is not None:
+            candidates = packer.pack("", candidates).texts
+        return "\n\n".join(candidates)
+
+    return search_documents
+
+
+def register_search_tool(document_index, callers, executor, packer=None):
+    """Lets each agent in `callers` call search_documents; `executor` runs the calls."""
+    import autogen
+
+    search_documents = make_search_tool(document_index, packer)
+    for caller in callers:
+        autogen.register_function(
+            search_documents,
+            caller=caller,
+            executor=executor,
+            name=SEARCH_TOOL_NAME,
+            description=SEARCH_TOOL_DESCRIPTION,
+        )
+    return search_documents
+
+
+def nested_chat_position(agent):
+    """Reply-function slot for nested chats on a tool executor: right after its tool and function call replies.
+
+    autogen's default of 2 would hand a tool call to the nested chat instead
+    of running it.
+    """
+    from autogen import ConversableAgent
+
+    tool_replies = (
+        ConversableAgent.generate_function_call_reply,
+        ConversableAgent.a_generate_function_call_reply,
+        ConversableAgent.generate_tool_calls_reply,
+        ConversableAgent.a_generate_tool_calls_reply,
+    )
+    replies = [entry["reply_func"] for entry in agent._reply_func_list]
+    return max(position for position, reply in enumerate(replies) if reply in tool_replies) + 1
+
+
+def end_chat_after_replies(agent, trigger, replies):
+    """Ends `agent`'s chats with `trigger` once `trigger` has given `replies` answers.
+
+    Use it in place of max_turns when `trigger` can call tools: a tool call
+    and its result take a turn each, so a fixed turn count ends the chat too
+    early or too late depending on how many searches the model makes.
+    """
+
+    def end_chat(recipient, messages=None, sender=None, config=None):
+        answers = [message for message in sender.chat_messages[recipient]
+                   if message.get("role") == "assistant"
+                   and not message.get("tool_calls") and not message.get("function_call")]
+        return len(answers) >= replies, None
+
+    agent.register_reply(trigger, end_chat, position=0)
@@ -0,0 +1,88 @@
+import logging
+import time
+
+from openai import BadRequestError
+
+from autogengui.rendering import SEPARATOR, format_message
+from autogengui.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_PROMPT = "Return entire conversation in plain text."
+
+
+def render_transcript(messages, role_names=None):
+    """The chat as plain text: each message under the name of the agent that sent it.
+
+    Two-agent histories carry roles rather than names; `role_names` maps them
+    (e.g. {"assistant": own name, "user": the other agent's name}).
+    """
+    role_names = role_names or {}
+    parts = []
+    for message in messages:
+        role = message.get("role", "")
+        name = message.get("name") or role_names.get(role, role)
+        parts.append(f"{name}:\n{format_message(message)}")
+    return f"\n{SEPARATOR}\n".join(parts)
+
+
+def summarize_with_llm(sender, recipient, summary_args):
+    """reflection_with_llm through the agents' public client: the chat plus the summary prompt as a system message."""
+    prompt = summary_args.get("summary_prompt", TRANSCRIPT_PROMPT)
+    messages = recipient.chat_messages_for_summary(sender) + [{"role": "system", "content": prompt}]
+    client = recipient.client if recipient.client is not None else sender.client
+    if client is None:
+        raise ValueError("No OpenAIWrapper client is found.")
+    try:
+        response = client.create(messages=messages, cache=summary_args.get("cache"))
+    except BadRequestError as e:
+        logger.warning(f"Cannot summarize the chat with the model: {e}")
+        return ""
+    return client.extract_text_or_completion_object(response)[0] or ""
+
+
+class TranscriptSummary:
+    """summary_method for initiate_chat that renders the chat locally.
+
+    With `use_llm` set (or "use_llm" in the chat's summary_args, which wins) it
+    asks the model instead, the way autogen's reflection_with_llm does.
+    The time of each summary is kept so report() can compare the two: a local
+    summary costs milliseconds, while the LLM summary re-sends the whole history
+    to the model and waits for it to be written out again.
+    """
+
+    def __init__(self, model="gpt-4", use_llm=False):
+        self.model = model
+        self.use_llm = use_llm
+        self.llm_seconds = []  # every LLM summary made this session
+        self.last_seconds = None
+        self.last_tokens = 0  # tokens in the history the last summary covered
+        self.last_used_llm = False
+
+    def __call__(self, sender, recipient, summary_args):
+        summary_args = dict(summary_args)
+        use_llm = summary_args.pop("use_llm", self.use_llm)
+        started = time.perf_counter()
+        text = render_transcript(sender.chat_messages[recipient], {"assistant": sender.name, "user": recipient.name})
+        summary = text
+        if use_llm:
+            summary = summarize_with_llm(sender, recipient, summary_args)
+        self.last_seconds = time.perf_counter() - started
+        self.last_tokens = count_tokens(text, self.model)
+        self.last_used_llm = use_llm
+        if use_llm:
+            self.llm_seconds.append(self.last_seconds)
+        logger.info(self.report())
+        return summary
+
+    def report(self):
+        if self.last_seconds is None:
+            return "No summary yet"
+        if self.last_used_llm:
+            return f"LLM summary of {self.last_tokens} history tokens took {self.last_seconds:.2f}s"
+        message = (f"Local summary of {self.last_tokens} history tokens took {self.last_seconds * 1000:.1f}ms "
+                   f"and sent nothing to the model")
+        if self.llm_seconds:
+            average = sum(self.llm_seconds) / len(self.llm_seconds)
+            message += f" (saved ~{average - self.last_seconds:.2f}s against the average LLM summary)"
+        return message
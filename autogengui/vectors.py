@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import re
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIMENSIONS = 512
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _features(text):
+    words = _WORD_RE.findall(text.lower())
+    features = list(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    # Character trigrams of each word make near-miss spellings and inflections overlap.
+    for word in words:
+        padded = f"<{word}>"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def embed(texts, dimensions=DEFAULT_DIMENSIONS):
+    """Signed feature-hashing embeddings, one L2-normalised float32 row per text."""
+    rows, columns, signs = [], [], []
+    for row, text in enumerate(texts):
+        # crc32 rather than hash(): str hashes are salted per process, and the
+        # vectors are persisted between sessions.
+        hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in _features(text)), dtype=np.uint32)
+        rows.append(np.full(hashes.shape, row, dtype=np.int64))
+        columns.append((hashes % dimensions).astype(np.int64))
+        signs.append(np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32))
+
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    if rows:
+        np.add.at(vectors, (np.concatenate(rows), np.concatenate(columns)), np.concatenate(signs))
+    vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class VectorIndex:
+    """Cosine-similarity index over hashed n-gram vectors.
+
+    The matrix lives in a memory-mapped file when `path` is given, so it can
+    grow past RAM and be reopened by the next session. Removing a chunk frees
+    its row for reuse instead of rebuilding the matrix.
+    """
+
+    def __init__(self, path=None, dimensions=DEFAULT_DIMENSIONS, capacity=1024):
+        self.path = path
+        self.dimensions = dimensions
+        self.chunks = {}  # row -> Chunk
+        self.documents = {}  # persisted DocumentIndex bookkeeping
+        self.settings = None
+        self._free = []
+        self._size = 0
+
+        if path and os.path.exists(path) and os.path.exists(self._meta_path):
+            try:
+                self._load()
+                return
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Discarding unreadable vector index {path}: {e}")
+                self.chunks, self.documents, self._free, self._size = {}, {}, [], 0
+        self.matrix = self._allocate(capacity)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def _meta_path(self):
+        return f"{self.path}.json"
+
+    def add(self, chunk):
+        return self.add_many([chunk])[0]
+
+    def add_many(self, chunks, terms=None):
+        # `terms` (BM25 term counts) is accepted for interface parity and ignored.
+        if not chunks:
+            return []
+        rows = [self._take_row() for _ in chunks]
+        self.matrix[rows] = embed([chunk.text for chunk in chunks], self.dimensions)
+        for row, chunk in zip(rows, chunks):
+            self.chunks[row] = chunk
+        return rows
+
+    def remove(self, row):
+        del self.chunks[row]
+        self.matrix[row] = 0
+        self._free.append(row)
+
+    def search(self, query, k=5):
+        if not self.chunks:
+            return []
+        query_vector = embed([query], self.dimensions)[0]
+        scores = self.matrix[:self._size] @ query_vector
+        if self._free:
+            scores[self._free] = -np.inf
+        k = min(k, len(self.chunks))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[row]), self.chunks[int(row)]) for row in best if scores[row] > 0]
+
+    def save(self, documents, settings=None):
+        self.documents = documents
+        self.settings = settings
+        if not self.path:
+            return
+        self.matrix.flush()
+        meta = {
+            "dimensions": self.dimensions,
+            "capacity": self.matrix.shape[0],
+            "size": self._size,
+            "free": self._free,
+            "settings": settings,
+            "documents": documents,
+            "chunks": [[row, chunk.source, chunk.index, chunk.text] for row, chunk in self.chunks.items()],
+        }
+        temp_path = f"{self._meta_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(temp_path, self._meta_path)
+
+    def _take_row(self):
+        if self._free:
+            return self._free.pop()
+        if self._size == self.matrix.shape[0]:
+            self._grow()
+        self._size += 1
+        return self._size - 1
+
+    def _allocate(self, capacity):
+        if not self.path:
+            return np.zeros((capacity, self.dimensions), dtype=np.float32)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        return np.memmap(self.path, dtype=np.float32, mode="w+", shape=(capacity, self.dimensions))
+
+    def _grow(self):
+        capacity = self.matrix.shape[0] * 2
+        if not self.path:
+            grown = np.zeros((capacity, self.dimensions), dtype=np.float32)
+            grown[:self._size] = self.matrix[:self._size]
+            self.matrix = grown
+            return
+        self.matrix.flush()
+        del self.matrix
+        with open(self.path, "r+b") as file:
+            file.truncate(capacity * self.dimensions * 4)  # new rows read back as zeros
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+
+    def _load(self):
+        from autogengui.retrieval import Chunk
+
+        with open(self._meta_path, "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        if meta["dimensions"] != self.dimensions:
+            raise ValueError(f"index has {meta['dimensions']} dimensions, expected {self.dimensions}")
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode="r+",
+                                shape=(meta["capacity"], self.dimensions))
+        self._size = meta["size"]
+        self._free = meta["free"]
+        self.settings = meta["settings"]
+        self.documents = {source: (digest, ids) for source, (digest, ids) in meta["documents"].items()}
+        self.chunks = {row: Chunk(source, index, text) for row, source, index, text in meta["chunks"]}